@@ -26,6 +26,8 @@ import os
 from datetime import datetime, timedelta
 from sqlalchemy import text
 from config.database import get_session
+from utils.json_utils import json_loads
+from utils.excel_utils import EXCEL_ENGINE, EXCEL_ENGINE_KWARGS
 
 # ============================================================
 # Constants
@@ -168,7 +170,7 @@ class PotentialCoinAnalyzer:
         if not bc_str:
             return None
         try:
-            bc = json.loads(bc_str)
+            bc = json_loads(bc_str)
         except (json.JSONDecodeError, TypeError):
             return None
 
@@ -1467,7 +1469,8 @@ class PotentialCoinAnalyzer:
             # '盈利钱包列表',
         ]
 
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        with pd.ExcelWriter(filename, engine=EXCEL_ENGINE,
+                            engine_kwargs=EXCEL_ENGINE_KWARGS) as writer:
             sheet_count = 0
             for name in sheet_order:
                 df = self.results.get(name)
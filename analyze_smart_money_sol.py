@@ -18,9 +18,13 @@ import pandas as pd
 import numpy as np
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from sqlalchemy import text
 from config.database import get_session
+from utils.json_utils import json_loads
+from utils.excel_utils import EXCEL_ENGINE, EXCEL_ENGINE_KWARGS
+from utils.dataframe_utils import top_n_rows
 
 # Quote Tokens（用于判断成本/收入币种）
 SOL_TOKENS = {'SOL', 'Wrapped SOL', 'WSOL'}
@@ -48,20 +52,25 @@ class SmartMoneySOLAnalyzer:
       7. 行为相似性
     """
 
-    def __init__(self, sol_price_usd=DEFAULT_SOL_PRICE_USD, days=30):
+    def __init__(self, sol_price_usd=DEFAULT_SOL_PRICE_USD, days=30,
+                 max_workers=4):
         """
         Args:
             sol_price_usd: SOL 参考价格（用于稳定币→SOL折算及 pnl_30d 显示转换）
             days: 分析的天数窗口（默认30天）
+            max_workers: 并行执行各分析步骤的线程数
         """
         self.sol_price_usd = sol_price_usd
         self.days = days
+        self.max_workers = max_workers
 
         # 数据容器
         self.wallets_df = None             # 所有非高频钱包
         self.profitable_wallets = None     # 30D盈利钱包
         self.trades_df = None              # 原始交易数据（sol_amount为SOL等值）
         self.token_profit_df = None        # 每个钱包-币种的SOL等值盈利
+        self._tp_by_wallet = {}            # 钱包地址 -> token_profit_df 子表
+        self._tp_by_token = {}             # 代币地址 -> token_profit_df 子表
         self.top10_tokens = None           # Top10高收益币种
         self.name_map = {}                 # address -> 钱包名称
         self.results = {}                  # 所有结果 DataFrame
@@ -164,7 +173,7 @@ class SmartMoneySOLAnalyzer:
             return None
 
         try:
-            bc = json.loads(bc_str)
+            bc = json_loads(bc_str)
         except (json.JSONDecodeError, TypeError):
             return None
 
@@ -647,9 +656,7 @@ class SmartMoneySOLAnalyzer:
             + df_rank['_norm_profit'] * 0.3, 4
         )
 
-        self.top10_tokens = df_rank.sort_values(
-            '综合评分', ascending=False
-        ).head(10).copy()
+        self.top10_tokens = top_n_rows(df_rank, '综合评分', 10).copy()
 
         # 清理临时列
         self.top10_tokens.drop(
@@ -685,6 +692,8 @@ class SmartMoneySOLAnalyzer:
         """
         Sheet 3: 30D盈利钱包买到 Top10 中几个币
         每个 Top10 币种加一列标记（持仓状态），直观展示覆盖情况
+
+        返回 (sheet_name, df)，无数据时返回 None
         """
         if self.top10_tokens is None or self.top10_tokens.empty:
             return
@@ -745,7 +754,7 @@ class SmartMoneySOLAnalyzer:
         # 每个 Top10 币种加一列：标记持仓状态（✓已清仓 / ◐部分卖出 / ●持仓中）
         for token_addr in top10_addrs:
             sym = top10_sym_map.get(token_addr, token_addr[:8])
-            token_records = hp_top10[hp_top10['代币地址'] == token_addr]
+            token_records = self._tp_by_token[token_addr]
             status_map = dict(zip(
                 token_records['钱包地址'], token_records['持仓状态']
             ))
@@ -773,13 +782,15 @@ class SmartMoneySOLAnalyzer:
             '买到Top10币种数', ascending=False
         ).reset_index(drop=True)
 
-        self.results['钱包Top10覆盖'] = wallet_coverage
         print(f"  {len(wallet_coverage)} 个钱包交易了Top10币种")
+        return '钱包Top10覆盖', wallet_coverage
 
     def _analyze_top10_wallet_profit(self):
         """
         Sheet 4: 按 Top10 币分组，各钱包在该币上的 SOL 盈利
         包含持仓状态，区分已实现和未实现
+
+        返回 (sheet_name, df)，无数据时返回 None
         """
         if self.top10_tokens is None or self.top10_tokens.empty:
             return
@@ -792,9 +803,10 @@ class SmartMoneySOLAnalyzer:
             token_sym = trow['代币符号']
             rank = trow['排名']
 
-            tdata = self.token_profit_df[
-                self.token_profit_df['代币地址'] == token_addr
-            ].sort_values('已实现盈亏(SOL)', ascending=False)
+            tdata = self._tp_by_token.get(token_addr)
+            if tdata is None:
+                continue
+            tdata = tdata.sort_values('已实现盈亏(SOL)', ascending=False)
 
             for _, r in tdata.iterrows():
                 rows.append({
@@ -818,8 +830,8 @@ class SmartMoneySOLAnalyzer:
 
         if rows:
             df = pd.DataFrame(rows)
-            self.results['Top10币种钱包盈利明细'] = df
             print(f"  Top10币种-钱包盈利明细: {len(df)} 条")
+            return 'Top10币种钱包盈利明细', df
 
     def _analyze_top10_wallet_all_tokens(self):
         """
@@ -828,6 +840,8 @@ class SmartMoneySOLAnalyzer:
         取 30D PnL 最高的前10个钱包，展示它们的完整交易记录（所有币种），
         包含买入时间、持仓状态、盈亏情况。
         按钱包 PnL 降序分组，组内按首次买入时间排序。
+
+        返回 (sheet_name, df)，无数据时返回 None
         """
         print("\n[5/7] 生成Top10盈利钱包完整持仓明细...")
 
@@ -903,13 +917,12 @@ class SmartMoneySOLAnalyzer:
             [c for c in col_order if c in all_trades.columns]
         ]
 
-        self.results['Top10钱包完整持仓'] = all_trades
-
         # 统计信息
         n_wallets = all_trades['钱包地址'].nunique()
         n_tokens = all_trades['代币地址'].nunique()
         print(f"  {n_wallets} 个Top10钱包共交易 {n_tokens} 个币种，"
               f"{len(all_trades)} 条记录")
+        return 'Top10钱包完整持仓', all_trades
 
     def _analyze_timing_similarity(self):
         """
@@ -919,6 +932,8 @@ class SmartMoneySOLAnalyzer:
           - 比较它们在共同买入的 Top10 币种上的首次买入时间差
           - 比较最后卖出时间差
           - 计算时间相似度分数（时差越小越相似）
+
+        返回 (sheet_name, df)，无数据时返回 None
         """
         print("\n[6/7] 分析买卖时间相似性...")
 
@@ -942,8 +957,7 @@ class SmartMoneySOLAnalyzer:
 
         # 构建时间字典: wallet -> {token_addr: {first_buy, last_sell}}
         wallet_timing = {}
-        for addr in hp_top10['钱包地址'].unique():
-            w_data = hp_top10[hp_top10['钱包地址'] == addr]
+        for addr, w_data in hp_top10.groupby('钱包地址', sort=False):
             timing = {}
             for _, r in w_data.iterrows():
                 fb = r['首次买入时间']
@@ -1027,11 +1041,11 @@ class SmartMoneySOLAnalyzer:
                 ['共同Top10币种数', '时间相似度'],
                 ascending=[False, False]
             ).reset_index(drop=True)
-            self.results['买卖时间相似性'] = timing_df
             print(f"  买卖时间相似性: {len(timing_df)} 个钱包对"
                   f"（共同Top10>=2）")
-        else:
-            print("  无足够数据进行时间相似性分析")
+            return '买卖时间相似性', timing_df
+
+        print("  无足够数据进行时间相似性分析")
 
     def _analyze_behavior_similarity(self):
         """
@@ -1042,6 +1056,8 @@ class SmartMoneySOLAnalyzer:
           - 仓位相似度: 总买入成本(SOL)接近程度
           - 胜率相似度: 盈利币种占比接近程度
           - 综合相似度 = 40%币种 + 30%仓位 + 30%胜率
+
+        返回 (sheet_name, df)，无数据时返回 None
         """
         print("\n[7/7] 分析行为相似性...")
 
@@ -1057,10 +1073,8 @@ class SmartMoneySOLAnalyzer:
         # 为每个盈利钱包构建行为特征向量
         features = []
         for addr in hp_addrs:
-            w_detail = self.token_profit_df[
-                self.token_profit_df['钱包地址'] == addr
-            ]
-            if w_detail.empty:
+            w_detail = self._tp_by_wallet.get(addr)
+            if w_detail is None:
                 continue
 
             n_tokens = len(w_detail)
@@ -1172,11 +1186,11 @@ class SmartMoneySOLAnalyzer:
             behavior_df = behavior_df.sort_values(
                 '综合相似度', ascending=False
             ).reset_index(drop=True)
-            self.results['行为相似性'] = behavior_df
             print(f"  行为相似性: {len(behavior_df)} 个钱包对"
                   f"（相似度>=0.3）")
-        else:
-            print("  无足够数据进行行为相似性分析")
+            return '行为相似性', behavior_df
+
+        print("  无足够数据进行行为相似性分析")
 
     # ============================================================
     # 报表输出
@@ -1201,7 +1215,8 @@ class SmartMoneySOLAnalyzer:
             '行为相似性',
         ]
 
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        with pd.ExcelWriter(filename, engine=EXCEL_ENGINE,
+                            engine_kwargs=EXCEL_ENGINE_KWARGS) as writer:
             sheet_count = 0
             for name in sheet_order:
                 df = self.results.get(name)
@@ -1252,23 +1267,33 @@ class SmartMoneySOLAnalyzer:
             print("没有有效盈利数据，退出")
             return
 
-        # 5. 生成概览 + Top10高收益币种
-        self._analyze_overview_and_top10()
-
-        # 6. 钱包Top10覆盖（买到几个）
-        self._analyze_wallet_top10_coverage()
-
-        # 7. Top10币种-钱包盈利明细
-        self._analyze_top10_wallet_profit()
-
-        # 8. Top10钱包完整持仓明细
-        self._analyze_top10_wallet_all_tokens()
+        # 按钱包 / 币种预分组一次，后续各分析步骤直接取子表，避免重复全表布尔筛选
+        self._tp_by_wallet = dict(tuple(
+            self.token_profit_df.groupby('钱包地址', sort=False)
+        ))
+        self._tp_by_token = dict(tuple(
+            self.token_profit_df.groupby('代币地址', sort=False)
+        ))
 
-        # 9. 买卖时间相似性
-        self._analyze_timing_similarity()
+        # 5. 生成概览 + Top10高收益币种（后续分析依赖 top10_tokens，先单独执行）
+        self._analyze_overview_and_top10()
 
-        # 10. 行为相似性
-        self._analyze_behavior_similarity()
+        # 6~10. 以下分析只读共享 DataFrame、互不依赖，放入线程池并行执行；
+        # 各步骤返回 (sheet_name, df)，统一在主线程写入 self.results
+        analyses = [
+            self._analyze_wallet_top10_coverage,    # 6. 钱包Top10覆盖（买到几个）
+            self._analyze_top10_wallet_profit,      # 7. Top10币种-钱包盈利明细
+            self._analyze_top10_wallet_all_tokens,  # 8. Top10钱包完整持仓明细
+            self._analyze_timing_similarity,        # 9. 买卖时间相似性
+            self._analyze_behavior_similarity,      # 10. 行为相似性
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(fn) for fn in analyses]
+            for future in futures:
+                result = future.result()
+                if result is not None:
+                    sheet_name, df = result
+                    self.results[sheet_name] = df
 
         # 11. 保存报表
         self._save_report()
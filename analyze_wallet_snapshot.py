@@ -13,21 +13,27 @@
 """
 
 import pandas as pd
-import json
+import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from sqlalchemy import text
+from utils.balance_change_utils import query_wallet_trades
 from config.database import get_session
-
-# Quote Tokens（用于判断成本/收入币种）
-SOL_TOKENS = {'SOL', 'Wrapped SOL', 'WSOL'}
-STABLECOINS = {'USDC', 'USDT', 'USD Coin'}
-QUOTE_TOKENS = SOL_TOKENS | STABLECOINS
+from utils.excel_utils import EXCEL_ENGINE, EXCEL_ENGINE_KWARGS
 
 # SOL → USD 参考价格（用于将数据库中 USD 计价的数据转换为 SOL）
 # 请根据实际时段调整此值
 SOL_PRICE_USD = 200
 
+# 交易平台 → smart_wallets / smart_wallets_snapshot 中的使用标记列
+PLATFORMS = {
+    'Trojan': 'uses_trojan',
+    'BullX': 'uses_bullx',
+    'Photon': 'uses_photon',
+    'Axiom': 'uses_axiom',
+}
+
 
 # ============================================================
 # 1. 数据查询
@@ -75,6 +81,10 @@ def get_non_hf_wallets():
             if col in df.columns:
                 df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
 
+        # 0/1 标记列用 int8，平台筛选/展开时扫描的数组更小
+        flag_cols = [c for c in df.columns if c.startswith(('uses_', 'is_'))]
+        df[flag_cols] = df[flag_cols].astype(np.int8)
+
         print(f"  查询到 {len(df)} 个非高频钱包")
         return df
 
@@ -178,6 +188,16 @@ def get_snapshot_data(addresses):
             if col in df.columns:
                 df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
 
+        # 平台标记列用 int8
+        flag_cols = [c for c in df.columns if c.startswith('uses_')]
+        df[flag_cols] = df[flag_cols].astype(np.int8)
+
+        # USD 计价的 30D 指标在入库时统一换算为 SOL、持仓时长换算为小时，
+        # 后续各分析直接读取，不再在每次聚合后重复换算
+        for col in ('pnl_30d', 'volume_30d', 'net_inflow_30d'):
+            df[f'{col}_sol'] = df[col].to_numpy() / SOL_PRICE_USD
+        df['avg_hold_time_30d_h'] = df['avg_hold_time_30d'].to_numpy() / 3600
+
         print(f"  获取 {len(df)} 条快照记录，"
               f"涵盖 {df['snapshot_date'].nunique()} 天、"
               f"{df['address'].nunique()} 个钱包")
@@ -186,6 +206,23 @@ def get_snapshot_data(addresses):
         session.close()
 
 
+def get_wallet_platforms(wallets_df):
+    """
+    由 wallets_df 的 uses_* 标记构建 地址 → 平台 长表
+
+    每个钱包使用的每个平台一行（同一平台下地址去重），平台内保持 wallets_df 中的出现顺序。
+    返回 DataFrame: platform_col（uses_* 列名）, address
+    """
+    platform_long = wallets_df.melt(
+        id_vars='address', value_vars=list(PLATFORMS.values()),
+        var_name='platform_col', value_name='used',
+    )
+    platform_long = platform_long[platform_long['used'] == 1].drop_duplicates(
+        ['platform_col', 'address']
+    )
+    return platform_long[['platform_col', 'address']].reset_index(drop=True)
+
+
 # ============================================================
 # 2. 分析每天钱包的流动性
 # ============================================================
@@ -204,31 +241,33 @@ def analyze_daily_liquidity(snapshot_df):
     dates = sorted(snapshot_df['snapshot_date'].unique())
     print(f"  日期范围: {dates[0]} ~ {dates[-1]}，共 {len(dates)} 天")
 
-    rows = []
-    for d in dates:
-        day = snapshot_df[snapshot_df['snapshot_date'] == d]
-        n = day['address'].nunique()
-
-        rows.append({
-            '日期': d,
-            '活跃钱包数': n,
-            # --- SOL 余额 ---
-            '平均SOL余额': round(day['sol_balance'].mean(), 4),
-            '总SOL余额': round(day['sol_balance'].sum(), 4),
-            # --- 30D 流动性（转换为 SOL）---
-            '平均30D交易量(SOL)': round(day['volume_30d'].mean() / SOL_PRICE_USD, 4),
-            '总30D交易量(SOL)': round(day['volume_30d'].sum() / SOL_PRICE_USD, 4),
-            '平均30D净流入(SOL)': round(day['net_inflow_30d'].mean() / SOL_PRICE_USD, 4),
-            '总30D净流入(SOL)': round(day['net_inflow_30d'].sum() / SOL_PRICE_USD, 4),
-            '平均30D交易次数': round(day['tx_count_30d'].mean(), 1),
-            '总30D交易次数': int(day['tx_count_30d'].sum()),
-            '平均30D买入次数': round(day['buy_count_30d'].mean(), 1),
-            '平均30D卖出次数': round(day['sell_count_30d'].mean(), 1),
-            '平均30D_PnL(SOL)': round(day['pnl_30d'].mean() / SOL_PRICE_USD, 4),
-            '总30D_PnL(SOL)': round(day['pnl_30d'].sum() / SOL_PRICE_USD, 4),
-        })
-
-    result = pd.DataFrame(rows)
+    # 按日期一次分组聚合得到所有指标，再按列统一四舍五入，不再逐日构建字典
+    result = snapshot_df.groupby('snapshot_date', sort=True).agg(**{
+        '活跃钱包数': ('address', 'nunique'),
+        # --- SOL 余额 ---
+        '平均SOL余额': ('sol_balance', 'mean'),
+        '总SOL余额': ('sol_balance', 'sum'),
+        # --- 30D 流动性（转换为 SOL）---
+        '平均30D交易量(SOL)': ('volume_30d_sol', 'mean'),
+        '总30D交易量(SOL)': ('volume_30d_sol', 'sum'),
+        '平均30D净流入(SOL)': ('net_inflow_30d_sol', 'mean'),
+        '总30D净流入(SOL)': ('net_inflow_30d_sol', 'sum'),
+        '平均30D交易次数': ('tx_count_30d', 'mean'),
+        '总30D交易次数': ('tx_count_30d', 'sum'),
+        '平均30D买入次数': ('buy_count_30d', 'mean'),
+        '平均30D卖出次数': ('sell_count_30d', 'mean'),
+        '平均30D_PnL(SOL)': ('pnl_30d_sol', 'mean'),
+        '总30D_PnL(SOL)': ('pnl_30d_sol', 'sum'),
+    }).rename_axis('日期').reset_index()
+
+    result['总30D交易次数'] = result['总30D交易次数'].astype(int)
+    result = result.round({
+        '平均SOL余额': 4, '总SOL余额': 4,
+        '平均30D交易量(SOL)': 4, '总30D交易量(SOL)': 4,
+        '平均30D净流入(SOL)': 4, '总30D净流入(SOL)': 4,
+        '平均30D交易次数': 1, '平均30D买入次数': 1, '平均30D卖出次数': 1,
+        '平均30D_PnL(SOL)': 4, '总30D_PnL(SOL)': 4,
+    })
     print(f"  生成 {len(result)} 天流动性数据")
     return result
 
@@ -237,7 +276,7 @@ def analyze_daily_liquidity(snapshot_df):
 # 2.5 钱包稳定性分析
 # ============================================================
 
-def analyze_wallet_stability(snapshot_df, wallets_df):
+def analyze_wallet_stability(snapshot_df, wallets_df, wallet_platforms=None):
     """
     分析各平台下钱包在 30D 维度的稳定性
 
@@ -249,6 +288,9 @@ def analyze_wallet_stability(snapshot_df, wallets_df):
       - 出现率 >= 80%
       - 30D 胜率的变异系数 < 30%
 
+    参数:
+      - wallet_platforms: get_wallet_platforms(wallets_df) 的结果，为 None 时在函数内构建
+
     返回:
       - stability_df: 所有钱包的稳定性分析明细
       - stable_df: 筛选出的稳定钱包清单
@@ -257,12 +299,7 @@ def analyze_wallet_stability(snapshot_df, wallets_df):
         print("  无快照数据")
         return None, None
 
-    platforms = {
-        'Trojan': 'uses_trojan',
-        'BullX': 'uses_bullx',
-        'Photon': 'uses_photon',
-        'Axiom': 'uses_axiom',
-    }
+    platforms = PLATFORMS
 
     total_dates = snapshot_df['snapshot_date'].nunique()
     print(f"  总快照天数: {total_dates}")
@@ -273,82 +310,92 @@ def analyze_wallet_stability(snapshot_df, wallets_df):
         'tx_count': 'tx_count_30d',
     }
 
-    all_rows = []
-    stable_rows = []
+    # 钱包名称按地址建一次映射（同一地址取第一条）
+    name_map = wallets_df.drop_duplicates('address').set_index('address')['name']
+
+    # 地址 → 平台 长表（每个使用的平台一行，保持 wallets_df 中的出现顺序）
+    if wallet_platforms is None:
+        wallet_platforms = get_wallet_platforms(wallets_df)
+
+    # 快照按地址打上平台标签后一次分组，得到所有 (平台, 钱包) 的均值/标准差
+    snap_tagged = snapshot_df.merge(wallet_platforms, on='address')
+    metric_cols = list(metrics_30d.values())
+    g = snap_tagged.groupby(['platform_col', 'address'], sort=False)
+    size_all = g.size()
+    appear_all = g['snapshot_date'].nunique()
+    means_all = g[metric_cols + ['pnl_30d_sol', 'avg_hold_time_30d_h']].mean()
+    stds_all = g[metric_cols].std()
+    tagged_platforms = set(size_all.index.get_level_values(0))
+
+    all_parts = []
+    stable_parts = []
 
     for pname, pcol in platforms.items():
-        platform_addrs = wallets_df[wallets_df[pcol] == 1]['address'].unique()
-        pdata = snapshot_df[snapshot_df['address'].isin(platform_addrs)]
+        platform_addrs = wallet_platforms.loc[wallet_platforms['platform_col'] == pcol, 'address']
 
-        if pdata.empty:
+        if pcol not in tagged_platforms:
             print(f"    {pname}: 无快照数据")
             continue
 
-        stable_count = 0
-        for addr in platform_addrs:
-            wdata = pdata[pdata['address'] == addr]
-            if wdata.empty:
-                continue
-
-            appear_count = wdata['snapshot_date'].nunique()
-            appear_rate = appear_count / total_dates * 100
-
-            name_row = wallets_df[wallets_df['address'] == addr]
-            wallet_name = ''
-            if not name_row.empty and pd.notna(name_row.iloc[0]['name']):
-                wallet_name = name_row.iloc[0]['name']
-
-            row = {
-                '平台': pname,
-                '钱包地址': addr,
-                '钱包名称': wallet_name,
-                '快照出现次数': appear_count,
-                '总快照天数': total_dates,
-                '出现率(%)': round(appear_rate, 1),
-            }
-
-            is_stable = appear_rate >= 80
-
-            for metric_label, col_name in metrics_30d.items():
-                series = wdata[col_name]
-                mean_val = series.mean()
-                std_val = series.std() if len(series) > 1 else 0
-
-                if abs(mean_val) > 1e-9:
-                    cv = abs(std_val / mean_val) * 100
-                else:
-                    cv = 0.0 if abs(std_val) < 1e-9 else 999.9
-
-                row[f'30D_{metric_label}_均值'] = round(mean_val, 2)
-                row[f'30D_{metric_label}_标准差'] = round(std_val, 2)
-                row[f'30D_{metric_label}_CV(%)'] = round(cv, 1)
-
-            # 稳定性看 30D 胜率的变异系数
-            wr_cv = row['30D_win_rate_CV(%)']
-            if wr_cv > 30:
-                is_stable = False
-
-            row['是否稳定'] = '是' if is_stable else '否'
-            all_rows.append(row)
-
-            if is_stable:
-                stable_count += 1
-                stable_rows.append({
-                    '平台': pname,
-                    '钱包地址': addr,
-                    '钱包名称': wallet_name,
-                    '出现率(%)': round(appear_rate, 1),
-                    '30D_PnL均值(SOL)': round(wdata['pnl_30d'].mean() / SOL_PRICE_USD, 4),
-                    '30D_胜率均值(%)': round(wdata['win_rate_30d'].mean(), 2),
-                    '30D_胜率CV(%)': row['30D_win_rate_CV(%)'],
-                    '30D_交易次数均值': round(wdata['tx_count_30d'].mean(), 1),
-                    '30D_持仓时长均值(小时)': round(wdata['avg_hold_time_30d'].mean() / 3600, 2) if wdata['avg_hold_time_30d'].mean() > 0 else 0,
-                })
-
-        print(f"    {pname}: {len(platform_addrs)} 个钱包，{stable_count} 个稳定")
-
-    stability_df = pd.DataFrame(all_rows) if all_rows else None
-    stable_df = pd.DataFrame(stable_rows) if stable_rows else None
+        # 保持 platform_addrs 的顺序，只保留有快照的钱包
+        key = pd.MultiIndex.from_arrays([np.full(len(platform_addrs), pcol, dtype=object),
+                                         platform_addrs.to_numpy()])
+        key = key[key.isin(size_all.index)]
+        addrs = key.get_level_values(1)
+        size = size_all.reindex(key).to_numpy()
+        appear_count = appear_all.reindex(key).to_numpy()
+        means = means_all.reindex(key)
+        stds = stds_all.reindex(key)
+        stds[size <= 1] = 0  # 只有一条快照时标准差记为 0
+
+        appear_rate = appear_count / total_dates * 100
+
+        stab = pd.DataFrame({
+            '平台': pname,
+            '钱包地址': addrs.to_numpy(),
+            '钱包名称': name_map.reindex(addrs).fillna('').to_numpy(),
+            '快照出现次数': appear_count,
+            '总快照天数': total_dates,
+            '出现率(%)': np.round(appear_rate, 1),
+        })
+
+        for metric_label, col_name in metrics_30d.items():
+            mean_val = means[col_name].to_numpy()
+            std_val = stds[col_name].to_numpy()
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cv = np.where(np.abs(mean_val) > 1e-9,
+                              np.abs(std_val / mean_val) * 100,
+                              np.where(np.abs(std_val) < 1e-9, 0.0, 999.9))
+
+            stab[f'30D_{metric_label}_均值'] = np.round(mean_val, 2)
+            stab[f'30D_{metric_label}_标准差'] = np.round(std_val, 2)
+            stab[f'30D_{metric_label}_CV(%)'] = np.round(cv, 1)
+
+        # 稳定性：出现率 >= 80% 且 30D 胜率的变异系数不超过 30%
+        is_stable = (appear_rate >= 80) & ~(stab['30D_win_rate_CV(%)'].to_numpy() > 30)
+        stab['是否稳定'] = np.where(is_stable, '是', '否')
+        all_parts.append(stab)
+
+        hold_mean = means['avg_hold_time_30d_h'].to_numpy()
+        stable_parts.append(pd.DataFrame({
+            '平台': pname,
+            '钱包地址': stab['钱包地址'],
+            '钱包名称': stab['钱包名称'],
+            '出现率(%)': stab['出现率(%)'],
+            '30D_PnL均值(SOL)': np.round(means['pnl_30d_sol'].to_numpy(), 4),
+            '30D_胜率均值(%)': np.round(means['win_rate_30d'].to_numpy(), 2),
+            '30D_胜率CV(%)': stab['30D_win_rate_CV(%)'],
+            '30D_交易次数均值': np.round(means['tx_count_30d'].to_numpy(), 1),
+            '30D_持仓时长均值(小时)': np.where(hold_mean > 0, np.round(hold_mean, 2), 0),
+        })[is_stable])
+
+        print(f"    {pname}: {len(platform_addrs)} 个钱包，{int(is_stable.sum())} 个稳定")
+
+    stability_df = pd.concat(all_parts, ignore_index=True) if all_parts else None
+    stable_df = pd.concat(stable_parts, ignore_index=True) if stable_parts else None
+    if stable_df is not None and stable_df.empty:
+        stable_df = None
 
     if stable_df is not None:
         print(f"  共 {len(stable_df)} 个稳定钱包")
@@ -362,6 +409,18 @@ def analyze_wallet_stability(snapshot_df, wallets_df):
 # 3. 分析不同渠道平台
 # ============================================================
 
+def _tag_rows_with_platforms(df, platforms):
+    """
+    把带 uses_* 标记的行按平台展开成长表（一个钱包用多个平台时出现多次）
+    新增 platform 列（按 platforms 顺序的分类类型），平台内保持原行顺序
+    """
+    flags = df[list(platforms.values())].to_numpy() == 1
+    plat_idx, row_idx = np.nonzero(flags.T)
+    tagged = df.iloc[row_idx].reset_index(drop=True)
+    tagged['platform'] = pd.Categorical.from_codes(plat_idx, categories=list(platforms))
+    return tagged
+
+
 def analyze_by_platform(snapshot_df):
     """
     按平台 (Trojan / BullX / Photon / Axiom) 分析（仅 30D 维度）：
@@ -374,63 +433,76 @@ def analyze_by_platform(snapshot_df):
         print("  无快照数据")
         return {}
 
-    platforms = {
-        'Trojan': 'uses_trojan',
-        'BullX': 'uses_bullx',
-        'Photon': 'uses_photon',
-        'Axiom': 'uses_axiom',
-    }
+    platforms = PLATFORMS
 
     result_dfs = {}
 
+    # 按快照行上的平台标记展开成 (平台, 快照) 长表，后续汇总和每日趋势都在这一张表上分组
+    tagged = _tag_rows_with_platforms(snapshot_df, platforms)
+
     # ---- 汇总表（使用最新日期的快照，仅 30D）----
     latest_date = snapshot_df['snapshot_date'].max()
-    latest_df = snapshot_df[snapshot_df['snapshot_date'] == latest_date]
+    latest = tagged[tagged['snapshot_date'] == latest_date]
+    latest = latest.assign(
+        is_profit=latest['pnl_30d'] > 0,
+        is_loss=latest['pnl_30d'] < 0,
+    )
     print(f"  平台汇总分析日期: {latest_date}")
 
+    # 所有平台、所有指标的分位数一次分组计算（每列只排序一次），
+    # 结果索引为 (platform, 分位点)；中位数即 0.5 分位，不再单独计算
+    by_platform = latest.groupby('platform', observed=True)
+    quantiles = by_platform[[
+        'pnl_30d_sol', 'win_rate_30d', 'tx_count_30d', 'buy_count_30d',
+        'sell_count_30d', 'avg_hold_time_30d_h', 'volume_30d_sol',
+    ]].quantile([0.10, 0.25, 0.50, 0.75, 0.90])
+    totals = by_platform.agg(
+        n=('address', 'size'),
+        pnl_sum=('pnl_30d_sol', 'sum'),
+        profit_n=('is_profit', 'sum'),
+        loss_n=('is_loss', 'sum'),
+    )
+
     summary_rows = []
-    for pname, pcol in platforms.items():
-        pdata = latest_df[latest_df[pcol] == 1]
-        if pdata.empty:
+    for pname in platforms:
+        if pname not in totals.index:
             print(f"    {pname}: 无数据")
             continue
-
-        n = len(pdata)
+        q = quantiles.loc[pname]
+        n = int(totals.at[pname, 'n'])
         print(f"    {pname}: {n} 个钱包")
 
-        profit_n = len(pdata[pdata['pnl_30d'] > 0])
-        loss_n = len(pdata[pdata['pnl_30d'] < 0])
-
-        pnl_series = pdata['pnl_30d'] / SOL_PRICE_USD
-        vol_series = pdata['volume_30d'] / SOL_PRICE_USD
+        profit_n = int(totals.at[pname, 'profit_n'])
+        loss_n = int(totals.at[pname, 'loss_n'])
+        hold_p50 = q.at[0.50, 'avg_hold_time_30d_h']
 
         summary_rows.append({
             '平台': pname,
             '钱包数': n,
             # PnL 分位数（SOL）
-            'PnL_P10(SOL)': round(pnl_series.quantile(0.10), 4),
-            'PnL_P25(SOL)': round(pnl_series.quantile(0.25), 4),
-            'PnL_P50(SOL)': round(pnl_series.median(), 4),
-            'PnL_P75(SOL)': round(pnl_series.quantile(0.75), 4),
-            'PnL_P90(SOL)': round(pnl_series.quantile(0.90), 4),
-            '总PnL(SOL)': round(pnl_series.sum(), 4),
+            'PnL_P10(SOL)': round(q.at[0.10, 'pnl_30d_sol'], 4),
+            'PnL_P25(SOL)': round(q.at[0.25, 'pnl_30d_sol'], 4),
+            'PnL_P50(SOL)': round(q.at[0.50, 'pnl_30d_sol'], 4),
+            'PnL_P75(SOL)': round(q.at[0.75, 'pnl_30d_sol'], 4),
+            'PnL_P90(SOL)': round(q.at[0.90, 'pnl_30d_sol'], 4),
+            '总PnL(SOL)': round(totals.at[pname, 'pnl_sum'], 4),
             # 胜率 分位数
-            '胜率_P25(%)': round(pdata['win_rate_30d'].quantile(0.25), 2),
-            '胜率_P50(%)': round(pdata['win_rate_30d'].median(), 2),
-            '胜率_P75(%)': round(pdata['win_rate_30d'].quantile(0.75), 2),
+            '胜率_P25(%)': round(q.at[0.25, 'win_rate_30d'], 2),
+            '胜率_P50(%)': round(q.at[0.50, 'win_rate_30d'], 2),
+            '胜率_P75(%)': round(q.at[0.75, 'win_rate_30d'], 2),
             # 交易次数 分位数
-            '交易次数_P25': round(pdata['tx_count_30d'].quantile(0.25), 1),
-            '交易次数_P50': round(pdata['tx_count_30d'].median(), 1),
-            '交易次数_P75': round(pdata['tx_count_30d'].quantile(0.75), 1),
+            '交易次数_P25': round(q.at[0.25, 'tx_count_30d'], 1),
+            '交易次数_P50': round(q.at[0.50, 'tx_count_30d'], 1),
+            '交易次数_P75': round(q.at[0.75, 'tx_count_30d'], 1),
             # 买卖次数 中位数
-            '买入次数_P50': round(pdata['buy_count_30d'].median(), 1),
-            '卖出次数_P50': round(pdata['sell_count_30d'].median(), 1),
+            '买入次数_P50': round(q.at[0.50, 'buy_count_30d'], 1),
+            '卖出次数_P50': round(q.at[0.50, 'sell_count_30d'], 1),
             # 持仓时长 分位数
-            '持仓时长_P50(小时)': round(pdata['avg_hold_time_30d'].median() / 3600, 2) if pdata['avg_hold_time_30d'].median() > 0 else 0,
+            '持仓时长_P50(小时)': round(hold_p50, 2) if hold_p50 > 0 else 0,
             # 交易量 分位数（SOL）
-            '交易量_P25(SOL)': round(vol_series.quantile(0.25), 4),
-            '交易量_P50(SOL)': round(vol_series.median(), 4),
-            '交易量_P75(SOL)': round(vol_series.quantile(0.75), 4),
+            '交易量_P25(SOL)': round(q.at[0.25, 'volume_30d_sol'], 4),
+            '交易量_P50(SOL)': round(q.at[0.50, 'volume_30d_sol'], 4),
+            '交易量_P75(SOL)': round(q.at[0.75, 'volume_30d_sol'], 4),
             # 盈亏钱包分布
             '盈利钱包数': profit_n,
             '亏损钱包数': loss_n,
@@ -441,32 +513,34 @@ def analyze_by_platform(snapshot_df):
         result_dfs['平台汇总'] = pd.DataFrame(summary_rows)
 
     # ---- 每个平台的每日 30D 趋势 ----
-    for pname, pcol in platforms.items():
-        pdata = snapshot_df[snapshot_df[pcol] == 1]
-        if pdata.empty:
+    # 所有平台、所有日期一次分组聚合，不再逐平台、逐日期布尔过滤
+    daily_all = tagged.groupby(['platform', 'snapshot_date'], observed=True).agg(
+        n_wallets=('address', 'nunique'),
+        pnl_mean=('pnl_30d_sol', 'mean'),
+        pnl_median=('pnl_30d_sol', 'median'),
+        pnl_sum=('pnl_30d_sol', 'sum'),
+        win_rate_mean=('win_rate_30d', 'mean'),
+        tx_mean=('tx_count_30d', 'mean'),
+        hold_mean=('avg_hold_time_30d_h', 'mean'),
+        sol_balance_mean=('sol_balance', 'mean'),
+    )
+
+    for pname in platforms:
+        if pname not in daily_all.index.get_level_values('platform'):
             continue
-
-        dates = sorted(pdata['snapshot_date'].unique())
-        daily = []
-        for d in dates:
-            day = pdata[pdata['snapshot_date'] == d]
-            n = day['address'].nunique()
-            hold_mean = day['avg_hold_time_30d'].mean()
-
-            daily.append({
-                '日期': d,
-                '钱包数': n,
-                '平均30D_PnL(SOL)': round(day['pnl_30d'].mean() / SOL_PRICE_USD, 4),
-                '中位30D_PnL(SOL)': round(day['pnl_30d'].median() / SOL_PRICE_USD, 4),
-                '总30D_PnL(SOL)': round(day['pnl_30d'].sum() / SOL_PRICE_USD, 4),
-                '平均30D胜率(%)': round(day['win_rate_30d'].mean(), 2),
-                '平均30D交易次数': round(day['tx_count_30d'].mean(), 1),
-                '平均30D持仓时长(小时)': round(hold_mean / 3600, 2) if hold_mean > 0 else 0,
-                '平均SOL余额': round(day['sol_balance'].mean(), 4),
-            })
-
-        if daily:
-            result_dfs[f'{pname}每日趋势'] = pd.DataFrame(daily)
+        day = daily_all.xs(pname, level='platform')
+        hold_mean = day['hold_mean']
+        result_dfs[f'{pname}每日趋势'] = pd.DataFrame({
+            '日期': day.index,
+            '钱包数': day['n_wallets'].to_numpy(),
+            '平均30D_PnL(SOL)': day['pnl_mean'].round(4).to_numpy(),
+            '中位30D_PnL(SOL)': day['pnl_median'].round(4).to_numpy(),
+            '总30D_PnL(SOL)': day['pnl_sum'].round(4).to_numpy(),
+            '平均30D胜率(%)': day['win_rate_mean'].round(2).to_numpy(),
+            '平均30D交易次数': day['tx_mean'].round(1).to_numpy(),
+            '平均30D持仓时长(小时)': hold_mean.round(2).where(hold_mean > 0, 0).to_numpy(),
+            '平均SOL余额': day['sol_balance_mean'].round(4).to_numpy(),
+        })
 
     return result_dfs
 
@@ -475,168 +549,53 @@ def analyze_by_platform(snapshot_df):
 # 4. 计算持仓收益率
 # ============================================================
 
-def parse_balance_change(bc_str):
-    """
-    解析 balance_change JSON
-
-    返回 dict:
-      - sol_amount:         SOL 数量变化（人类可读单位，买入为负、卖出为正）
-      - stablecoin_amount:  稳定币(USDC/USDT)数量变化
-      - sol_equivalent:     统一 SOL 等值 = sol_amount + stablecoin_amount / SOL_PRICE_USD
-      - is_token_swap:      是否为代币互换（成本/收入主要是非 Quote 代币）
-      - token_symbol, token_name, token_address, token_amount
-    """
-    if not bc_str:
-        return None
-
-    try:
-        bc = json.loads(bc_str)
-    except (json.JSONDecodeError, TypeError):
-        return None
-
-    if not isinstance(bc, list) or len(bc) < 2:
-        return None
-
-    sol_total = 0.0
-    stable_total = 0.0
-    token_info = None
-    other_tokens = []  # 非 Quote、非目标代币
-
-    for item in bc:
-        symbol = item.get('symbol', '')
-        name = item.get('name', '')
-        raw_amount = item.get('amount', 0)
-        decimals = item.get('decimals', 0)
-        address = item.get('address', '')
-
-        # 转换为人类可读金额
-        if decimals and decimals > 0:
-            amount = raw_amount / (10 ** decimals)
-        else:
-            amount = raw_amount
-
-        is_sol = (symbol in SOL_TOKENS or name in SOL_TOKENS)
-        is_stable = (symbol in STABLECOINS or name in STABLECOINS)
-
-        if is_sol:
-            sol_total += amount
-        elif is_stable:
-            stable_total += amount
-        else:
-            # 非 Quote 代币：保留绝对值最大的作为目标代币
-            if token_info is None or abs(amount) > abs(token_info['amount']):
-                if token_info is not None:
-                    other_tokens.append(token_info)
-                token_info = {
-                    'symbol': symbol or name or 'UNKNOWN',
-                    'name': name,
-                    'address': address,
-                    'amount': amount,
-                }
-            else:
-                other_tokens.append({
-                    'symbol': symbol or name or 'UNKNOWN',
-                    'address': address,
-                    'amount': amount,
-                })
-
-    if token_info is None:
-        return None
-
-    # 统一 SOL 等值（将稳定币折算为 SOL）
-    sol_equivalent = sol_total + stable_total / SOL_PRICE_USD
-
-    # 检测代币互换：如果 SOL 变化极小（仅 gas）且没有稳定币参与，
-    # 但有其他非目标代币参与（如用 Buttcoin 买 x1xhlol），则为代币互换
-    sol_is_gas_only = abs(sol_total) < 0.01  # < 0.01 SOL
-    no_stablecoin = abs(stable_total) < 0.01
-    has_other = any(abs(t['amount']) > 0 for t in other_tokens)
-    is_token_swap = sol_is_gas_only and no_stablecoin and has_other
-
-    return {
-        'sol_amount': sol_total,
-        'stablecoin_amount': stable_total,
-        'sol_equivalent': sol_equivalent,
-        'is_token_swap': is_token_swap,
-        'token_symbol': token_info['symbol'],
-        'token_name': token_info['name'],
-        'token_address': token_info['address'],
-        'token_amount': token_info['amount'],
-    }
-
-
-def get_wallet_transactions(addresses, batch_size=50):
+def get_wallet_transactions(addresses):
     """
     批量查询 birdeye_wallet_transactions 中指定钱包的 buy/sell 交易
-    解析 balance_change，返回交易明细列表
+    解析 balance_change，返回交易明细 DataFrame（解析与查询见 utils/balance_change_utils.py）
     """
     session = get_session()
-    trades = []
-    addr_list = list(addresses)
-    total_batches = (len(addr_list) + batch_size - 1) // batch_size
-
     try:
-        for i in range(0, len(addr_list), batch_size):
-            batch = addr_list[i:i + batch_size]
-            batch_num = i // batch_size + 1
-
-            params = {f'a{j}': addr for j, addr in enumerate(batch)}
-            in_clause = ', '.join([f':a{j}' for j in range(len(batch))])
-
-            sql = text(f"""
-                SELECT `from`, block_time, side, balance_change
-                FROM birdeye_wallet_transactions
-                WHERE `from` IN ({in_clause})
-                  AND side IN ('buy', 'sell')
-                ORDER BY block_time ASC
-            """)
-
-            result = session.execute(sql, params)
-            rows = result.fetchall()
-
-            for row in rows:
-                parsed = parse_balance_change(row[3])
-                if parsed is None:
-                    continue
-
-                trades.append({
-                    'address': row[0],
-                    'block_time': row[1],
-                    'side': row[2],
-                    'sol_amount': parsed['sol_equivalent'],
-                    'is_token_swap': parsed['is_token_swap'],
-                    'token_symbol': parsed['token_symbol'],
-                    'token_address': parsed['token_address'],
-                    'token_amount': parsed['token_amount'],
-                })
-
-            if batch_num % 5 == 0 or batch_num == total_batches:
-                print(f"    进度: {batch_num}/{total_batches} 批次，"
-                      f"已获取 {len(trades)} 条交易")
-
-        print(f"  共获取 {len(trades)} 条有效 buy/sell 交易记录")
-        return trades
+        trades_df = query_wallet_trades(session, list(addresses))
     finally:
         session.close()
 
+    # 统一 SOL 等值（将稳定币折算为 SOL）
+    trades_df['sol_amount'] = trades_df['sol_total'] + trades_df['stable_total'] / SOL_PRICE_USD
+    trades_df = trades_df[['address', 'block_time', 'side', 'sol_amount', 'is_token_swap',
+                           'token_symbol', 'token_address', 'token_amount']]
+
+    print(f"  共获取 {len(trades_df)} 条有效 buy/sell 交易记录")
+    return trades_df
+
 
-def analyze_token_returns(addresses, wallets_df=None):
+def analyze_token_returns(addresses, wallets_df=None, trades_df=None,
+                          wallet_platforms=None):
     """
     计算每个钱包每个币种的收益率（以 SOL 为单位）
 
+    参数:
+      - trades_df: 已查询好的交易明细（get_wallet_transactions 的结果），
+                   为 None 时在函数内查询
+      - wallet_platforms: get_wallet_platforms(wallets_df) 的结果，为 None 时在函数内构建
+
     返回:
       - platform_df: 按平台分组的收益率统计（分位数）
     """
-    print(f"  查询 {len(addresses)} 个钱包的交易记录...")
-    trades = get_wallet_transactions(addresses)
+    if trades_df is None:
+        print(f"  查询 {len(addresses)} 个钱包的交易记录...")
+        trades_df = get_wallet_transactions(addresses)
 
-    if not trades:
+    if trades_df.empty:
         print("  无交易数据")
         return None
 
-    trades_df = pd.DataFrame(trades)
     trades_df['block_time'] = pd.to_datetime(trades_df['block_time'])
 
+    # 低基数字符串列转为 Categorical，groupby 按整数编码分组而不是逐行哈希字符串
+    for col in ('address', 'token_address', 'token_symbol', 'side'):
+        trades_df[col] = trades_df[col].astype('category')
+
     # 时间窗口定义
     time_windows = [
         ('1小时', timedelta(hours=1)),
@@ -647,142 +606,153 @@ def analyze_token_returns(addresses, wallets_df=None):
         ('30天', timedelta(days=30)),
     ]
 
-    # ---- 逐钱包-代币分析 ----
-    results = []
-    grouped = trades_df.groupby(['address', 'token_address'])
-    total_groups = len(grouped)
-    print(f"  分析 {total_groups} 个钱包-代币组合...")
-
-    skipped_swap = 0
-    processed = 0
-    for (address, token_address), group in grouped:
-        processed += 1
-        buys = group[group['side'] == 'buy'].sort_values('block_time')
-        sells = group[group['side'] == 'sell'].sort_values('block_time')
-
-        if buys.empty:
-            continue
-
-        first_buy_time = buys.iloc[0]['block_time']
-        token_symbol = buys.iloc[0]['token_symbol']
-
-        # 过滤掉代币互换交易（成本无法可靠计算）
-        normal_buys = buys[~buys['is_token_swap']]
-        normal_sells = sells[~sells['is_token_swap']]
-
-        # 成本（SOL）：仅来自非代币互换的买入（sol_amount 为负，取绝对值）
-        total_cost = abs(normal_buys['sol_amount'].sum()) if not normal_buys.empty else 0
-
-        # 如果所有买入都是代币互换，无法确定成本 → 跳过
-        if total_cost < 0.0001:
-            skipped_swap += 1
-            continue
-
-        # 收入（SOL）：仅来自非代币互换的卖出（sol_amount 为正）
-        total_revenue = normal_sells['sol_amount'].sum() if not normal_sells.empty else 0
-        total_return = (total_revenue - total_cost) / total_cost * 100
-
-        row = {
-            '钱包地址': address,
-            '代币符号': token_symbol,
-            '代币地址': token_address,
-            '买入总成本(SOL)': round(total_cost, 4),
-            '卖出总收入(SOL)': round(total_revenue, 4),
-            '总收益率(%)': round(total_return, 2),
-        }
-
-        # 不同时间窗口的收益率
-        for wname, wdelta in time_windows:
-            w_end = first_buy_time + wdelta
-
-            w_buys = normal_buys[normal_buys['block_time'] <= w_end]
-            w_sells = normal_sells[normal_sells['block_time'] <= w_end]
-
-            w_cost = abs(w_buys['sol_amount'].sum()) if not w_buys.empty else 0
-            w_rev = w_sells['sol_amount'].sum() if not w_sells.empty else 0
-
-            if w_cost > 0:
-                w_ret = (w_rev - w_cost) / w_cost * 100
-            else:
-                w_ret = 0.0
-
-            row[f'{wname}_收益率(%)'] = round(w_ret, 2)
-
-        results.append(row)
-
-        if processed % 2000 == 0:
-            print(f"    已处理 {processed}/{total_groups} 组合")
+    # ---- 钱包-代币收益（分组聚合，无逐组循环）----
+    # 全局按时间稳定排序一次，组内 first 即按时间最早的一条
+    trades_df = trades_df.sort_values('block_time', kind='stable').reset_index(drop=True)
+    keys = ['address', 'token_address']
+    is_buy = trades_df['side'] == 'buy'
+    is_sell = trades_df['side'] == 'sell'
+    is_normal = ~trades_df['is_token_swap'].astype(bool)
+
+    # 代币互换交易不计入成本/收入（成本无法可靠计算），首次买入时间和符号仍按全部买入计
+    trades_df['buy_sol'] = trades_df['sol_amount'].where(is_buy & is_normal, 0.0)
+    trades_df['sell_sol'] = trades_df['sol_amount'].where(is_sell & is_normal, 0.0)
+    trades_df['buy_time'] = trades_df['block_time'].where(is_buy)
+    trades_df['buy_symbol'] = trades_df['token_symbol'].where(is_buy)
+
+    grouped = trades_df.groupby(keys, observed=True)
+    n_groups = grouped.ngroups
+    print(f"  分析 {n_groups} 个钱包-代币组合...")
+    combo = grouped.agg(
+        first_buy=('buy_time', 'min'),
+        token_symbol=('buy_symbol', 'first'),
+        buy_sol=('buy_sol', 'sum'),
+        sell_sol=('sell_sol', 'sum'),
+    )
+
+    # 时间窗口：以首次买入时间为起点，窗口内的成本/收入 = 组内前缀和在截止位置的取值
+    # 行按 (组编号, 时间) 重排后每组是一段连续区间，截止位置用 searchsorted 一次求出所有组；
+    # 排序键 = 组编号 * stride + 时间的稠密排名，保证跨组全局有序。
+    # 6 个窗口共用同一份前缀和，不再逐窗口掩码后重新分组求和
+    # （无买入的组合首次买入为 NaT，对应 int64 最小值，截止位置即区间起点，窗口和为 0）
+    gid = grouped.ngroup().to_numpy()
+    order = np.argsort(gid, kind='stable')  # 已全局按时间排序，组内仍保持时间顺序
+    block_ns = trades_df['block_time'].to_numpy(dtype='datetime64[ns]').view('int64')
+    uniq_ns, time_rank = np.unique(block_ns, return_inverse=True)
+    stride = len(uniq_ns) + 1
+    seg_key = gid[order].astype(np.int64) * stride + time_rank[order]
+    group_base = np.arange(n_groups, dtype=np.int64) * stride
+    seg_start = np.searchsorted(seg_key, group_base)
+
+    # 组内前缀和（每组从 0 起累加，不带入其他组的累计误差）
+    cum_buy = grouped['buy_sol'].cumsum().to_numpy()[order]
+    cum_sell = grouped['sell_sol'].cumsum().to_numpy()[order]
+    first_buy_ns = combo['first_buy'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+    for i, (_, wdelta) in enumerate(time_windows):
+        cutoff_rank = np.searchsorted(uniq_ns, first_buy_ns + pd.Timedelta(wdelta).value,
+                                      side='right')
+        seg_end = np.searchsorted(seg_key, group_base + cutoff_rank)
+        in_window = seg_end > seg_start
+        last = np.maximum(seg_end - 1, 0)
+        combo[f'w{i}_cost'] = np.where(in_window, cum_buy[last], 0.0)
+        combo[f'w{i}_rev'] = np.where(in_window, cum_sell[last], 0.0)
+
+    # 没有买入记录的组合直接丢弃
+    combo = combo[combo['first_buy'].notna()]
+
+    # 成本（SOL）：仅来自非代币互换的买入（sol_amount 为负，取绝对值）
+    # 如果所有买入都是代币互换，无法确定成本 → 跳过
+    combo['total_cost'] = combo['buy_sol'].abs()
+    valid_cost = combo['total_cost'] >= 0.0001
+    skipped_swap = int((~valid_cost).sum())
+    combo = combo[valid_cost].reset_index()
+
+    # 收入（SOL）：仅来自非代币互换的卖出（sol_amount 为正）
+    total_cost = combo['total_cost']
+    total_revenue = combo['sell_sol']
+    total_return = (total_revenue - total_cost) / total_cost * 100
 
     if skipped_swap > 0:
         print(f"  跳过 {skipped_swap} 个代币互换组合（成本无法确定）")
 
-    if not results:
+    if combo.empty:
         print("  无有效收益率数据")
         return None
 
-    detail_df = pd.DataFrame(results)
+    # 明细对外仍输出普通字符串列，后续合并平台信息不受 Categorical 语义影响
+    detail_df = pd.DataFrame({
+        '钱包地址': combo['address'].astype(object),
+        '代币符号': combo['token_symbol'].astype(object),
+        '代币地址': combo['token_address'].astype(object),
+        '买入总成本(SOL)': total_cost.round(4),
+        '卖出总收入(SOL)': total_revenue.round(4),
+        '总收益率(%)': total_return.round(2),
+    })
+
+    # 不同时间窗口的收益率
+    for i, (wname, _) in enumerate(time_windows):
+        w_cost = combo[f'w{i}_cost'].abs()
+        w_rev = combo[f'w{i}_rev']
+        w_ret = ((w_rev - w_cost) / w_cost.where(w_cost > 0) * 100).fillna(0.0)
+        detail_df[f'{wname}_收益率(%)'] = w_ret.round(2)
+
     print(f"  生成 {len(detail_df)} 条持仓收益率记录")
 
     # ---- 按平台分组的收益率（分位数）----
     platform_df = None
     if wallets_df is not None and not wallets_df.empty:
-        platforms = {
-            'Trojan': 'uses_trojan',
-            'BullX': 'uses_bullx',
-            'Photon': 'uses_photon',
-            'Axiom': 'uses_axiom',
-        }
-
-        # 合并钱包平台信息
-        platform_cols = ['address'] + list(platforms.values())
+        platforms = PLATFORMS
+
+        # 合并钱包平台信息：明细按 地址 → 平台 长表打标签一次，各平台直接取分组
+        if wallet_platforms is None:
+            wallet_platforms = get_wallet_platforms(wallets_df)
         merged = detail_df.merge(
-            wallets_df[platform_cols],
-            left_on='钱包地址', right_on='address', how='left'
+            wallet_platforms, left_on='钱包地址', right_on='address'
         )
-
-        plat_rows = []
-        for pname, pcol in platforms.items():
-            pdata = merged[merged[pcol] == 1]
-            if pdata.empty:
-                continue
-
-            n_p = len(pdata)
-            prof_p = pdata[pdata['总收益率(%)'] > 0]
-
-            # 计算盈亏 SOL 汇总
-            total_pnl_sol = (pdata['卖出总收入(SOL)'].sum() - pdata['买入总成本(SOL)'].sum())
-
-            prow = {
-                '平台': pname,
-                '交易对数': n_p,
+        merged['is_profit'] = merged['总收益率(%)'] > 0
+
+        # 所有平台一次分组：计数/汇总一次 agg，分位数一次 quantile（每列只排序一次）
+        by_platform = merged.groupby('platform_col', sort=False)
+        totals = by_platform.agg(
+            n=('钱包地址', 'size'),
+            cost=('买入总成本(SOL)', 'sum'),
+            revenue=('卖出总收入(SOL)', 'sum'),
+            profit_n=('is_profit', 'sum'),
+        )
+        ret_q = by_platform['总收益率(%)'].quantile([0.10, 0.25, 0.50, 0.75, 0.90]).unstack()
+
+        # 时间窗口收益率为 0 的记录不参与分位数：置为 NaN 后 quantile 自动跳过
+        win_cols = [f'{wname}_收益率(%)' for wname, _ in time_windows]
+        win_q = merged[win_cols].where(merged[win_cols] != 0).groupby(
+            merged['platform_col'], sort=False
+        ).quantile([0.25, 0.50, 0.75])
+
+        # 按 PLATFORMS 顺序输出有数据的平台
+        pcols = [pcol for pcol in platforms.values() if pcol in totals.index]
+        if pcols:
+            totals = totals.loc[pcols]
+            ret_q = ret_q.loc[pcols]
+            platform_df = pd.DataFrame({
+                '平台': [pname for pname, pcol in platforms.items() if pcol in pcols],
+                '交易对数': totals['n'].to_numpy(),
                 # 总盈亏（SOL）
-                '总盈亏(SOL)': round(total_pnl_sol, 4),
+                '总盈亏(SOL)': (totals['revenue'] - totals['cost']).round(4).to_numpy(),
                 # 总收益率 分位数
-                '总收益率_P10(%)': round(pdata['总收益率(%)'].quantile(0.10), 2),
-                '总收益率_P25(%)': round(pdata['总收益率(%)'].quantile(0.25), 2),
-                '总收益率_P50(%)': round(pdata['总收益率(%)'].median(), 2),
-                '总收益率_P75(%)': round(pdata['总收益率(%)'].quantile(0.75), 2),
-                '总收益率_P90(%)': round(pdata['总收益率(%)'].quantile(0.90), 2),
-                '盈利比例(%)': round(len(prof_p) / n_p * 100, 1),
-            }
-
-            # 各时间窗口分位数
-            for wname, _ in time_windows:
-                col = f'{wname}_收益率(%)'
-                valid = pdata[pdata[col] != 0]
-                if not valid.empty:
-                    prow[f'{wname}_P25(%)'] = round(valid[col].quantile(0.25), 2)
-                    prow[f'{wname}_P50(%)'] = round(valid[col].median(), 2)
-                    prow[f'{wname}_P75(%)'] = round(valid[col].quantile(0.75), 2)
-                else:
-                    prow[f'{wname}_P25(%)'] = 0
-                    prow[f'{wname}_P50(%)'] = 0
-                    prow[f'{wname}_P75(%)'] = 0
-
-            plat_rows.append(prow)
-
-        if plat_rows:
-            platform_df = pd.DataFrame(plat_rows)
+                '总收益率_P10(%)': ret_q[0.10].round(2).to_numpy(),
+                '总收益率_P25(%)': ret_q[0.25].round(2).to_numpy(),
+                '总收益率_P50(%)': ret_q[0.50].round(2).to_numpy(),
+                '总收益率_P75(%)': ret_q[0.75].round(2).to_numpy(),
+                '总收益率_P90(%)': ret_q[0.90].round(2).to_numpy(),
+                '盈利比例(%)': (totals['profit_n'] / totals['n'] * 100).round(1).to_numpy(),
+            })
+
+            # 各时间窗口分位数（窗口内无有效记录的平台记为 0）
+            for wname, col in zip([w for w, _ in time_windows], win_cols):
+                wq = win_q[col].unstack().reindex(pcols).fillna(0).round(2)
+                platform_df[f'{wname}_P25(%)'] = wq[0.25].to_numpy()
+                platform_df[f'{wname}_P50(%)'] = wq[0.50].to_numpy()
+                platform_df[f'{wname}_P75(%)'] = wq[0.75].to_numpy()
 
     return platform_df
 
@@ -801,7 +771,8 @@ def save_to_excel(all_results, filename=None):
     print(f"保存报表: {filename}")
     print(f"{'=' * 60}")
 
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+    with pd.ExcelWriter(filename, engine=EXCEL_ENGINE,
+                        engine_kwargs=EXCEL_ENGINE_KWARGS) as writer:
         sheet_count = 0
 
         def write_sheet(df, name):
@@ -854,25 +825,36 @@ def main():
     print("\n获取关联快照数据...")
     snapshot_df = get_snapshot_data(addresses)
 
-    all_results = {}
-
-    # 2. 每天钱包流动性
-    print("\n[2/5] 分析每天钱包流动性...")
-    all_results['daily_liquidity'] = analyze_daily_liquidity(snapshot_df)
-
-    # 3. 钱包稳定性分析（仅保留稳定钱包清单）
-    print("\n[3/5] 分析钱包稳定性（30D 变动性）...")
-    _, stable_df = analyze_wallet_stability(snapshot_df, wallets_df)
-    all_results['stable_wallets'] = stable_df
+    # 地址 → 平台 标签只构建一次，稳定性分析和持仓收益率共用
+    wallet_platforms = get_wallet_platforms(wallets_df)
 
-    # 4. 不同渠道平台分析（分位数汇总 + 各平台趋势）
-    print("\n[4/5] 分析不同渠道平台（分位数）...")
-    all_results['platform'] = analyze_by_platform(snapshot_df)
+    all_results = {}
 
-    # 5. 平台持仓收益率（分位数）
-    print("\n[5/5] 计算平台持仓收益率...")
-    platform_df = analyze_token_returns(addresses, wallets_df)
-    all_results['platform_returns'] = platform_df
+    # 交易记录查询以数据库 IO 为主，且与步骤 2~4 的快照分析互不依赖：
+    # 放到后台线程提前开始，与快照分析重叠执行，步骤 5 直接取结果
+    print(f"\n后台查询 {len(addresses)} 个钱包的交易记录...")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        trades_future = executor.submit(get_wallet_transactions, addresses)
+
+        # 2. 每天钱包流动性
+        print("\n[2/5] 分析每天钱包流动性...")
+        all_results['daily_liquidity'] = analyze_daily_liquidity(snapshot_df)
+
+        # 3. 钱包稳定性分析（仅保留稳定钱包清单）
+        print("\n[3/5] 分析钱包稳定性（30D 变动性）...")
+        _, stable_df = analyze_wallet_stability(snapshot_df, wallets_df, wallet_platforms)
+        all_results['stable_wallets'] = stable_df
+
+        # 4. 不同渠道平台分析（分位数汇总 + 各平台趋势）
+        print("\n[4/5] 分析不同渠道平台（分位数）...")
+        all_results['platform'] = analyze_by_platform(snapshot_df)
+
+        # 5. 平台持仓收益率（分位数）
+        print("\n[5/5] 计算平台持仓收益率...")
+        platform_df = analyze_token_returns(addresses, wallets_df,
+                                            trades_df=trades_future.result(),
+                                            wallet_platforms=wallet_platforms)
+        all_results['platform_returns'] = platform_df
 
     # 保存 Excel
     save_to_excel(all_results)
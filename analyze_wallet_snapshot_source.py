@@ -12,26 +12,48 @@
 
 import pandas as pd
 import numpy as np
-import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date
 from sqlalchemy import text
+from utils.balance_change_utils import query_wallet_trades
 from config.database import get_session, db_config
+from utils.excel_utils import EXCEL_ENGINE, EXCEL_ENGINE_KWARGS
+from utils.dataframe_utils import top_n_rows
 
-# Quote Tokens（用于判断成本/收入币种）
-SOL_TOKENS = {'SOL', 'Wrapped SOL', 'WSOL'}
-STABLECOINS = {'USDC', 'USDT', 'USD Coin'}
-QUOTE_TOKENS = SOL_TOKENS | STABLECOINS
+try:
+    from numba import njit, prange  # 可选：JIT 编译收益汇总、重叠计数等热点循环
+except ImportError:
+    njit = None
+    prange = range
 
 # SOL → USD 参考价格（用于将 SOL 计价的交易统一为 USD）
 # 请根据实际时段调整此值
 SOL_PRICE_USD = 200
 
+# 快照中的平台标记列打包为一个 uint8 位掩码（platform_flags）的位值
+PLATFORM_FLAG_BITS = {
+    'uses_trojan': 1 << 0,
+    'uses_bullx': 1 << 1,
+    'uses_photon': 1 << 2,
+    'uses_axiom': 1 << 3,
+}
+
 
 # ============================================================
 # 1. 数据查询
 # ============================================================
 
+def _frame_from_result(result):
+    """
+    查询结果 -> DataFrame
+    from_records 一次把行元组转成列数组，coerce_float 顺带把 DECIMAL 转成 float
+    （即 pd.read_sql 内部的构建方式；不直接用 read_sql 是因为 pandas 3 要求更新的 SQLAlchemy）
+    """
+    return pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()),
+                                     coerce_float=True)
+
+
 def get_non_hf_wallets():
     """
     查询 smart_wallets 中 is_high_frequency = 0 的钱包
@@ -53,11 +75,9 @@ def get_non_hf_wallets():
             WHERE is_high_frequency = 0
         """)
         result = session.execute(sql)
-        columns = list(result.keys())
-        rows = result.fetchall()
-        df = pd.DataFrame(rows, columns=columns)
+        df = _frame_from_result(result)
 
-        # 数值类型转换
+        # 数值类型转换（处理 NULL 与非数值）
         float_cols = ['pnl_1d', 'pnl_7d', 'pnl_30d',
                       'win_rate_1d', 'win_rate_7d', 'win_rate_30d',
                       'balance', 'sol_balance']
@@ -94,9 +114,7 @@ def get_non_hf_wallets():
                 FROM smart_wallets
             """)
             result = session.execute(sql)
-            columns = list(result.keys())
-            rows = result.fetchall()
-            df = pd.DataFrame(rows, columns=columns)
+            df = _frame_from_result(result)
             print(f"  (is_high_frequency 列可能不存在) 查询到 {len(df)} 个钱包")
             return df
         except Exception as e2:
@@ -106,83 +124,102 @@ def get_non_hf_wallets():
         session.close()
 
 
+# 快照查询固定批大小，最后一批用空地址补齐，保证每批 SQL 文本完全一致，
+# 语句只编译一次，数据库端也只需规划一次
+SNAPSHOT_BATCH_SIZE = 100
+_SNAPSHOT_PAD_ADDRESS = ''  # 钱包地址不可能为空串，作为补位哨兵
+
+# 快照批次并发查询的线程数（不超过连接池 pool_size）
+SNAPSHOT_QUERY_WORKERS = 4
+
+_SNAPSHOT_SQL = text(f"""
+    SELECT address, snapshot_date, name,
+           balance, sol_balance,
+           uses_trojan, uses_bullx, uses_photon, uses_axiom,
+           pnl_1d, volume_1d, net_inflow_1d,
+           tx_count_1d, buy_count_1d, sell_count_1d,
+           avg_hold_time_1d, win_rate_1d,
+           pnl_7d, volume_7d, net_inflow_7d,
+           tx_count_7d, buy_count_7d, sell_count_7d,
+           avg_hold_time_7d, win_rate_7d,
+           pnl_30d, volume_30d, net_inflow_30d,
+           tx_count_30d, buy_count_30d, sell_count_30d,
+           avg_hold_time_30d, win_rate_30d
+    FROM smart_wallets_snapshot
+    WHERE address IN ({', '.join(f':a{j}' for j in range(SNAPSHOT_BATCH_SIZE))})
+      AND snapshot_date >= '2026-02-03'
+    ORDER BY snapshot_date ASC
+""")
+
+
+def _query_snapshot_batch(batch):
+    """查询单批地址的快照；每个线程使用独立会话，从连接池取连接"""
+    batch = batch + [_SNAPSHOT_PAD_ADDRESS] * (SNAPSHOT_BATCH_SIZE - len(batch))
+    params = {f'a{j}': addr for j, addr in enumerate(batch)}
+
+    session = get_session()
+    try:
+        df = _frame_from_result(session.execute(_SNAPSHOT_SQL, params))
+        return df if not df.empty else None
+    finally:
+        session.close()
+
+
 def get_snapshot_data(addresses):
     """
     获取关联的 smart_wallets_snapshot 快照数据
-    按 address 批量查询，返回 DataFrame
+    按 address 分批（固定批大小、SQL 文本一致），多线程并发查询，返回 DataFrame
     """
     if not addresses:
         return pd.DataFrame()
 
-    session = get_session()
-    try:
-        all_dfs = []
-        batch_size = 100
-        addr_list = list(addresses)
-
-        for i in range(0, len(addr_list), batch_size):
-            batch = addr_list[i:i + batch_size]
-            params = {f'a{j}': addr for j, addr in enumerate(batch)}
-            in_clause = ', '.join([f':a{j}' for j in range(len(batch))])
-
-            sql = text(f"""
-                SELECT address, snapshot_date, name,
-                       balance, sol_balance,
-                       uses_trojan, uses_bullx, uses_photon, uses_axiom,
-                       pnl_1d, volume_1d, net_inflow_1d,
-                       tx_count_1d, buy_count_1d, sell_count_1d,
-                       avg_hold_time_1d, win_rate_1d,
-                       pnl_7d, volume_7d, net_inflow_7d,
-                       tx_count_7d, buy_count_7d, sell_count_7d,
-                       avg_hold_time_7d, win_rate_7d,
-                       pnl_30d, volume_30d, net_inflow_30d,
-                       tx_count_30d, buy_count_30d, sell_count_30d,
-                       avg_hold_time_30d, win_rate_30d
-                FROM smart_wallets_snapshot
-                WHERE address IN ({in_clause})
-                  AND snapshot_date >= '2026-02-03'
-                ORDER BY snapshot_date ASC
-            """)
-            result = session.execute(sql, params)
-            cols = list(result.keys())
-            rows = result.fetchall()
-            if rows:
-                all_dfs.append(pd.DataFrame(rows, columns=cols))
-
-        if not all_dfs:
-            print("  没有找到快照数据")
-            return pd.DataFrame()
+    batch_size = SNAPSHOT_BATCH_SIZE
+    addr_list = list(addresses)
+    batches = [addr_list[i:i + batch_size] for i in range(0, len(addr_list), batch_size)]
 
-        df = pd.concat(all_dfs, ignore_index=True)
+    # 各批次相互独立，数据库 IO 期间线程释放 GIL；map 保持批次原有顺序
+    with ThreadPoolExecutor(max_workers=SNAPSHOT_QUERY_WORKERS) as executor:
+        all_dfs = [df for df in executor.map(_query_snapshot_batch, batches)
+                   if df is not None]
 
-        # 浮点列
-        float_cols = [
-            'balance', 'sol_balance',
-            'pnl_1d', 'volume_1d', 'net_inflow_1d', 'win_rate_1d',
-            'pnl_7d', 'volume_7d', 'net_inflow_7d', 'win_rate_7d',
-            'pnl_30d', 'volume_30d', 'net_inflow_30d', 'win_rate_30d',
-        ]
-        for col in float_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    if not all_dfs:
+        print("  没有找到快照数据")
+        return pd.DataFrame()
 
-        # 整数列
-        int_cols = [
-            'tx_count_1d', 'buy_count_1d', 'sell_count_1d', 'avg_hold_time_1d',
-            'tx_count_7d', 'buy_count_7d', 'sell_count_7d', 'avg_hold_time_7d',
-            'tx_count_30d', 'buy_count_30d', 'sell_count_30d', 'avg_hold_time_30d',
-            'uses_trojan', 'uses_bullx', 'uses_photon', 'uses_axiom',
-        ]
-        for col in int_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+    df = pd.concat(all_dfs, ignore_index=True)
 
-        print(f"  获取 {len(df)} 条快照记录，"
-              f"涵盖 {df['snapshot_date'].nunique()} 天、"
-              f"{df['address'].nunique()} 个钱包")
-        return df
-    finally:
-        session.close()
+    # 浮点列
+    float_cols = [
+        'balance', 'sol_balance',
+        'pnl_1d', 'volume_1d', 'net_inflow_1d', 'win_rate_1d',
+        'pnl_7d', 'volume_7d', 'net_inflow_7d', 'win_rate_7d',
+        'pnl_30d', 'volume_30d', 'net_inflow_30d', 'win_rate_30d',
+    ]
+    for col in float_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # 整数列
+    int_cols = [
+        'tx_count_1d', 'buy_count_1d', 'sell_count_1d', 'avg_hold_time_1d',
+        'tx_count_7d', 'buy_count_7d', 'sell_count_7d', 'avg_hold_time_7d',
+        'tx_count_30d', 'buy_count_30d', 'sell_count_30d', 'avg_hold_time_30d',
+        'uses_trojan', 'uses_bullx', 'uses_photon', 'uses_axiom',
+    ]
+    for col in int_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+
+    # 平台标记打包成单字节位掩码，按平台筛选只需扫描一列 uint8
+    flags = np.zeros(len(df), dtype=np.uint8)
+    for col, bit in PLATFORM_FLAG_BITS.items():
+        flags[df[col].to_numpy() != 0] |= bit
+    df['platform_flags'] = flags
+
+    print(f"  获取 {len(df)} 条快照记录，"
+          f"涵盖 {df['snapshot_date'].nunique()} 天、"
+          f"{df['address'].nunique()} 个钱包")
+    return df
 
 
 # ============================================================
@@ -203,33 +240,35 @@ def analyze_daily_liquidity(snapshot_df):
     dates = sorted(snapshot_df['snapshot_date'].unique())
     print(f"  日期范围: {dates[0]} ~ {dates[-1]}，共 {len(dates)} 天")
 
-    rows = []
-    for d in dates:
-        day = snapshot_df[snapshot_df['snapshot_date'] == d]
-        n = day['address'].nunique()
-
-        rows.append({
-            '日期': d,
-            '活跃钱包数': n,
-            # --- 余额 ---
-            '平均SOL余额': round(day['sol_balance'].mean(), 4),
-            '总SOL余额': round(day['sol_balance'].sum(), 4),
-            '平均余额(USD)': round(day['balance'].mean(), 2),
-            '总余额(USD)': round(day['balance'].sum(), 2),
-            # --- 1D 流动性 ---
-            '平均日交易量(USD)': round(day['volume_1d'].mean(), 2),
-            '总日交易量(USD)': round(day['volume_1d'].sum(), 2),
-            '平均日净流入(USD)': round(day['net_inflow_1d'].mean(), 2),
-            '总日净流入(USD)': round(day['net_inflow_1d'].sum(), 2),
-            '平均日交易次数': round(day['tx_count_1d'].mean(), 1),
-            '总日交易次数': int(day['tx_count_1d'].sum()),
-            '平均日买入次数': round(day['buy_count_1d'].mean(), 1),
-            '平均日卖出次数': round(day['sell_count_1d'].mean(), 1),
-            '平均1D_PnL(USD)': round(day['pnl_1d'].mean(), 2),
-            '总1D_PnL(USD)': round(day['pnl_1d'].sum(), 2),
-        })
-
-    result = pd.DataFrame(rows)
+    # 按日期一次分组聚合得到所有指标，再按列统一四舍五入
+    result = snapshot_df.groupby('snapshot_date', sort=True).agg(**{
+        '活跃钱包数': ('address', 'nunique'),
+        # --- 余额 ---
+        '平均SOL余额': ('sol_balance', 'mean'),
+        '总SOL余额': ('sol_balance', 'sum'),
+        '平均余额(USD)': ('balance', 'mean'),
+        '总余额(USD)': ('balance', 'sum'),
+        # --- 1D 流动性 ---
+        '平均日交易量(USD)': ('volume_1d', 'mean'),
+        '总日交易量(USD)': ('volume_1d', 'sum'),
+        '平均日净流入(USD)': ('net_inflow_1d', 'mean'),
+        '总日净流入(USD)': ('net_inflow_1d', 'sum'),
+        '平均日交易次数': ('tx_count_1d', 'mean'),
+        '总日交易次数': ('tx_count_1d', 'sum'),
+        '平均日买入次数': ('buy_count_1d', 'mean'),
+        '平均日卖出次数': ('sell_count_1d', 'mean'),
+        '平均1D_PnL(USD)': ('pnl_1d', 'mean'),
+        '总1D_PnL(USD)': ('pnl_1d', 'sum'),
+    }).rename_axis('日期').reset_index()
+    result['总日交易次数'] = result['总日交易次数'].astype(int)
+    result = result.round({
+        '平均SOL余额': 4, '总SOL余额': 4,
+        '平均余额(USD)': 2, '总余额(USD)': 2,
+        '平均日交易量(USD)': 2, '总日交易量(USD)': 2,
+        '平均日净流入(USD)': 2, '总日净流入(USD)': 2,
+        '平均日交易次数': 1, '平均日买入次数': 1, '平均日卖出次数': 1,
+        '平均1D_PnL(USD)': 2, '总1D_PnL(USD)': 2,
+    })
     print(f"  生成 {len(result)} 天流动性数据")
     return result
 
@@ -277,27 +316,35 @@ def analyze_wallet_stability(snapshot_df, wallets_df):
     all_rows = []
     stable_rows = []
 
-    for pname, pcol in platforms.items():
-        platform_addrs = wallets_df[wallets_df[pcol] == 1]['address'].unique()
-        pdata = snapshot_df[snapshot_df['address'].isin(platform_addrs)]
+    # 一次分组得到每个地址的行位置，循环内按位置取子表，不再逐个地址整表布尔筛选
+    rows_by_addr = snapshot_df.groupby('address', sort=False).indices
+    # 地址 → 钱包名称（取第一条记录，空值记为 ''）
+    first_wallets = wallets_df.drop_duplicates('address')
+    name_by_addr = dict(zip(first_wallets['address'],
+                            first_wallets['name'].where(first_wallets['name'].notna(), '')))
+
+    # 四个平台标记一次取成布尔矩阵，按列直接索引地址数组，不再为每个平台复制整张钱包表
+    wallet_addrs = wallets_df['address'].to_numpy()
+    platform_member = wallets_df[list(platforms.values())].to_numpy() == 1
 
-        if pdata.empty:
+    for p, pname in enumerate(platforms):
+        platform_addrs = pd.unique(wallet_addrs[platform_member[:, p]])
+
+        if not any(addr in rows_by_addr for addr in platform_addrs):
             print(f"    {pname}: 无快照数据")
             continue
 
         stable_count = 0
         for addr in platform_addrs:
-            wdata = pdata[pdata['address'] == addr]
-            if wdata.empty:
+            positions = rows_by_addr.get(addr)
+            if positions is None:
                 continue
+            wdata = snapshot_df.iloc[positions]
 
             appear_count = wdata['snapshot_date'].nunique()
             appear_rate = appear_count / total_dates * 100
 
-            name_row = wallets_df[wallets_df['address'] == addr]
-            wallet_name = ''
-            if not name_row.empty and pd.notna(name_row.iloc[0]['name']):
-                wallet_name = name_row.iloc[0]['name']
+            wallet_name = name_by_addr.get(addr, '')
 
             row = {
                 '平台': pname,
@@ -371,6 +418,19 @@ def analyze_wallet_stability(snapshot_df, wallets_df):
 # 3. 分析不同渠道平台
 # ============================================================
 
+def _tag_rows_with_platform_bits(df, platforms):
+    """
+    按 platform_flags 位掩码把快照行展开成长表（一个钱包用多个平台时出现多次）
+    新增 platform 列（按 platforms 顺序的分类类型），平台内保持原行顺序
+    """
+    bits = np.array([PLATFORM_FLAG_BITS[pcol] for pcol in platforms.values()], dtype=np.uint8)
+    flags = df['platform_flags'].to_numpy()
+    plat_idx, row_idx = np.nonzero((flags[np.newaxis, :] & bits[:, np.newaxis]) != 0)
+    tagged = df.iloc[row_idx].reset_index(drop=True)
+    tagged['platform'] = pd.Categorical.from_codes(plat_idx, categories=list(platforms))
+    return tagged
+
+
 def analyze_by_platform(snapshot_df):
     """
     按平台 (Trojan / BullX / Photon / Axiom) 分析：
@@ -395,21 +455,31 @@ def analyze_by_platform(snapshot_df):
     # ---- 汇总表（使用最新日期的快照） ----
     latest_date = snapshot_df['snapshot_date'].max()
     latest_df = snapshot_df[snapshot_df['snapshot_date'] == latest_date]
+    latest_flags = latest_df['platform_flags'].to_numpy()
     print(f"  平台汇总分析日期: {latest_date}")
 
+    # 各平台钱包数、各维度盈利/亏损钱包数用一次广播比较得到，不再逐个布尔筛选计数
+    dims = [('1D', '_1d'), ('7D', '_7d'), ('30D', '_30d')]
+    plat_bits = np.array([PLATFORM_FLAG_BITS[pcol] for pcol in platforms.values()], dtype=np.uint8)
+    member = (latest_flags[:, np.newaxis] & plat_bits) != 0                      # (行数, 平台数)
+    pnl_mat = latest_df[[f'pnl{sfx}' for _, sfx in dims]].to_numpy(dtype=np.float64)  # (行数, 维度数)
+    n_wallets = member.sum(axis=0)
+    n_profit = (member[:, :, np.newaxis] & (pnl_mat[:, np.newaxis, :] > 0)).sum(axis=0)
+    n_loss = (member[:, :, np.newaxis] & (pnl_mat[:, np.newaxis, :] < 0)).sum(axis=0)
+
     summary_rows = []
-    for pname, pcol in platforms.items():
-        pdata = latest_df[latest_df[pcol] == 1]
-        if pdata.empty:
+    for p, (pname, pcol) in enumerate(platforms.items()):
+        n = int(n_wallets[p])
+        if n == 0:
             print(f"    {pname}: 无数据")
             continue
 
-        n = len(pdata)
+        pdata = latest_df[(latest_flags & PLATFORM_FLAG_BITS[pcol]) != 0]
         print(f"    {pname}: {n} 个钱包")
 
-        for dim, sfx in [('1D', '_1d'), ('7D', '_7d'), ('30D', '_30d')]:
-            profit_n = len(pdata[pdata[f'pnl{sfx}'] > 0])
-            loss_n = len(pdata[pdata[f'pnl{sfx}'] < 0])
+        for d, (dim, sfx) in enumerate(dims):
+            profit_n = int(n_profit[p, d])
+            loss_n = int(n_loss[p, d])
 
             summary_rows.append({
                 '平台': pname,
@@ -449,32 +519,36 @@ def analyze_by_platform(snapshot_df):
         result_dfs['平台汇总'] = pd.DataFrame(summary_rows)
 
     # ---- 每个平台的每日 7D 趋势 ----
-    for pname, pcol in platforms.items():
-        pdata = snapshot_df[snapshot_df[pcol] == 1]
-        if pdata.empty:
-            continue
-
-        dates = sorted(pdata['snapshot_date'].unique())
-        daily = []
-        for d in dates:
-            day = pdata[pdata['snapshot_date'] == d]
-            n = day['address'].nunique()
-            hold_mean = day['avg_hold_time_7d'].mean()
-
-            daily.append({
-                '日期': d,
-                '钱包数': n,
-                '平均7D_PnL(USD)': round(day['pnl_7d'].mean(), 2),
-                '中位7D_PnL(USD)': round(day['pnl_7d'].median(), 2),
-                '总7D_PnL(USD)': round(day['pnl_7d'].sum(), 2),
-                '平均7D胜率(%)': round(day['win_rate_7d'].mean(), 2),
-                '平均7D交易次数': round(day['tx_count_7d'].mean(), 1),
-                '平均7D持仓时长(小时)': round(hold_mean / 3600, 2) if hold_mean > 0 else 0,
-                '平均SOL余额': round(day['sol_balance'].mean(), 4),
-            })
+    # 按平台位掩码展开成 (平台, 快照) 长表，四个平台的每日统计一次 groupby 完成
+    tagged = _tag_rows_with_platform_bits(snapshot_df, platforms)
+    daily_all = tagged.groupby(['platform', 'snapshot_date'], observed=True).agg(
+        n=('address', 'nunique'),
+        pnl_mean=('pnl_7d', 'mean'),
+        pnl_median=('pnl_7d', 'median'),
+        pnl_sum=('pnl_7d', 'sum'),
+        wr_mean=('win_rate_7d', 'mean'),
+        tx_mean=('tx_count_7d', 'mean'),
+        hold_mean=('avg_hold_time_7d', 'mean'),
+        sol_mean=('sol_balance', 'mean'),
+    )
 
-        if daily:
-            result_dfs[f'{pname}每日趋势'] = pd.DataFrame(daily)
+    for pname in platforms:
+        if pname not in daily_all.index.get_level_values('platform'):
+            continue
+        daily = daily_all.xs(pname, level='platform')
+        hold_mean = daily['hold_mean']
+
+        result_dfs[f'{pname}每日趋势'] = pd.DataFrame({
+            '日期': daily.index,
+            '钱包数': daily['n'].to_numpy(),
+            '平均7D_PnL(USD)': daily['pnl_mean'].round(2).to_numpy(),
+            '中位7D_PnL(USD)': daily['pnl_median'].round(2).to_numpy(),
+            '总7D_PnL(USD)': daily['pnl_sum'].round(2).to_numpy(),
+            '平均7D胜率(%)': daily['wr_mean'].round(2).to_numpy(),
+            '平均7D交易次数': daily['tx_mean'].round(1).to_numpy(),
+            '平均7D持仓时长(小时)': np.where(hold_mean > 0, (hold_mean / 3600).round(2), 0),
+            '平均SOL余额': daily['sol_mean'].round(4).to_numpy(),
+        })
 
     return result_dfs
 
@@ -483,149 +557,77 @@ def analyze_by_platform(snapshot_df):
 # 4. 计算持仓收益率
 # ============================================================
 
-def parse_balance_change(bc_str):
+def get_wallet_transactions(addresses):
     """
-    解析 balance_change JSON
-
-    返回 dict:
-      - sol_amount:         SOL 数量变化（人类可读单位，买入为负、卖出为正）
-      - stablecoin_amount:  稳定币(USDC/USDT)数量变化（等于 USD）
-      - usd_amount:         统一 USD 等值 = sol_amount * SOL_PRICE_USD + stablecoin_amount
-      - is_token_swap:      是否为代币互换（成本/收入主要是非 Quote 代币）
-      - token_symbol, token_name, token_address, token_amount
+    批量查询 birdeye_wallet_transactions 中指定钱包的 buy/sell 交易
+    解析 balance_change，返回交易明细 DataFrame（解析与查询见 utils/balance_change_utils.py）
     """
-    if not bc_str:
-        return None
-
+    session = get_session()
     try:
-        bc = json.loads(bc_str)
-    except (json.JSONDecodeError, TypeError):
-        return None
-
-    if not isinstance(bc, list) or len(bc) < 2:
-        return None
-
-    sol_total = 0.0
-    stable_total = 0.0
-    token_info = None
-    other_tokens = []  # 非 Quote、非目标代币
-
-    for item in bc:
-        symbol = item.get('symbol', '')
-        name = item.get('name', '')
-        raw_amount = item.get('amount', 0)
-        decimals = item.get('decimals', 0)
-        address = item.get('address', '')
-
-        # 转换为人类可读金额
-        if decimals and decimals > 0:
-            amount = raw_amount / (10 ** decimals)
-        else:
-            amount = raw_amount
-
-        is_sol = (symbol in SOL_TOKENS or name in SOL_TOKENS)
-        is_stable = (symbol in STABLECOINS or name in STABLECOINS)
-
-        if is_sol:
-            sol_total += amount
-        elif is_stable:
-            stable_total += amount
-        else:
-            # 非 Quote 代币：保留绝对值最大的作为目标代币
-            if token_info is None or abs(amount) > abs(token_info['amount']):
-                if token_info is not None:
-                    other_tokens.append(token_info)
-                token_info = {
-                    'symbol': symbol or name or 'UNKNOWN',
-                    'name': name,
-                    'address': address,
-                    'amount': amount,
-                }
-            else:
-                other_tokens.append({
-                    'symbol': symbol or name or 'UNKNOWN',
-                    'address': address,
-                    'amount': amount,
-                })
-
-    if token_info is None:
-        return None
+        trades_df = query_wallet_trades(session, list(addresses))
+    finally:
+        session.close()
 
     # 统一 USD 等值
-    usd_amount = sol_total * SOL_PRICE_USD + stable_total
-
-    # 检测代币互换：如果 SOL 变化极小（仅 gas）且没有稳定币参与，
-    # 但有其他非目标代币参与（如用 Buttcoin 买 x1xhlol），则为代币互换
-    sol_is_gas_only = abs(sol_total) < 0.01  # < 0.01 SOL ≈ $2
-    no_stablecoin = abs(stable_total) < 0.01
-    has_other = any(abs(t['amount']) > 0 for t in other_tokens)
-    is_token_swap = sol_is_gas_only and no_stablecoin and has_other
-
-    return {
-        'sol_amount': sol_total,
-        'stablecoin_amount': stable_total,
-        'usd_amount': usd_amount,
-        'is_token_swap': is_token_swap,
-        'token_symbol': token_info['symbol'],
-        'token_name': token_info['name'],
-        'token_address': token_info['address'],
-        'token_amount': token_info['amount'],
-    }
-
-
-def get_wallet_transactions(addresses, batch_size=50):
-    """
-    批量查询 birdeye_wallet_transactions 中指定钱包的 buy/sell 交易
-    解析 balance_change，返回交易明细列表
-    """
-    session = get_session()
-    trades = []
-    addr_list = list(addresses)
-    total_batches = (len(addr_list) + batch_size - 1) // batch_size
+    trades_df['usd_amount'] = trades_df['sol_total'] * SOL_PRICE_USD + trades_df['stable_total']
+    trades_df = trades_df[['address', 'block_time', 'side', 'usd_amount', 'is_token_swap',
+                           'token_symbol', 'token_address', 'token_amount']]
 
-    try:
-        for i in range(0, len(addr_list), batch_size):
-            batch = addr_list[i:i + batch_size]
-            batch_num = i // batch_size + 1
-
-            params = {f'a{j}': addr for j, addr in enumerate(batch)}
-            in_clause = ', '.join([f':a{j}' for j in range(len(batch))])
-
-            sql = text(f"""
-                SELECT `from`, block_time, side, balance_change
-                FROM birdeye_wallet_transactions
-                WHERE `from` IN ({in_clause})
-                  AND side IN ('buy', 'sell')
-                ORDER BY block_time ASC
-            """)
+    print(f"  共获取 {len(trades_df)} 条有效 buy/sell 交易记录")
+    return trades_df
 
-            result = session.execute(sql, params)
-            rows = result.fetchall()
-
-            for row in rows:
-                parsed = parse_balance_change(row[3])
-                if parsed is None:
-                    continue
-
-                trades.append({
-                    'address': row[0],
-                    'block_time': row[1],
-                    'side': row[2],
-                    'usd_amount': parsed['usd_amount'],
-                    'is_token_swap': parsed['is_token_swap'],
-                    'token_symbol': parsed['token_symbol'],
-                    'token_address': parsed['token_address'],
-                    'token_amount': parsed['token_amount'],
-                })
 
-            if batch_num % 5 == 0 or batch_num == total_batches:
-                print(f"    进度: {batch_num}/{total_batches} 批次，"
-                      f"已获取 {len(trades)} 条交易")
+def _wallet_summary_loop(codes, cost, rev, ret, n):
+    """
+    单次扫描收益率明细，按钱包编号汇总（供 Numba 编译）
 
-        print(f"  共获取 {len(trades)} 条有效 buy/sell 交易记录")
-        return trades
-    finally:
-        session.close()
+    返回: 买入成本和、卖出收入和、币种数、盈利/亏损币种数、最佳/最差币种收益率
+    """
+    sum_cost = np.zeros(n)
+    sum_rev = np.zeros(n)
+    n_tokens = np.zeros(n, dtype=np.int64)
+    n_profit = np.zeros(n, dtype=np.int64)
+    n_loss = np.zeros(n, dtype=np.int64)
+    max_ret = np.full(n, -np.inf)
+    min_ret = np.full(n, np.inf)
+
+    for i in range(codes.shape[0]):
+        g = codes[i]
+        r = ret[i]
+        sum_cost[g] += cost[i]
+        sum_rev[g] += rev[i]
+        n_tokens[g] += 1
+        if r > 0:
+            n_profit[g] += 1
+        elif r < 0:
+            n_loss[g] += 1
+        if r > max_ret[g]:
+            max_ret[g] = r
+        if r < min_ret[g]:
+            min_ret[g] = r
+
+    return sum_cost, sum_rev, n_tokens, n_profit, n_loss, max_ret, min_ret
+
+
+def _wallet_summary_numpy(codes, cost, rev, ret, n):
+    """_wallet_summary_loop 的纯 NumPy 实现（未安装 Numba 时使用）"""
+    max_ret = np.full(n, -np.inf)
+    min_ret = np.full(n, np.inf)
+    np.maximum.at(max_ret, codes, ret)
+    np.minimum.at(min_ret, codes, ret)
+
+    return (np.bincount(codes, weights=cost, minlength=n),
+            np.bincount(codes, weights=rev, minlength=n),
+            np.bincount(codes, minlength=n),
+            np.bincount(codes[ret > 0], minlength=n),
+            np.bincount(codes[ret < 0], minlength=n),
+            max_ret, min_ret)
+
+
+if njit is not None:
+    _wallet_summary = njit(cache=True)(_wallet_summary_loop)
+else:
+    _wallet_summary = _wallet_summary_numpy
 
 
 def analyze_token_returns(addresses, wallets_df=None):
@@ -639,15 +641,21 @@ def analyze_token_returns(addresses, wallets_df=None):
       - platform_df: 按平台分组的收益率统计（分位数）
     """
     print(f"  查询 {len(addresses)} 个钱包的交易记录...")
-    trades = get_wallet_transactions(addresses)
+    trades_df = get_wallet_transactions(addresses)
 
-    if not trades:
+    if trades_df.empty:
         print("  无交易数据")
         return None, None, None, None
 
-    trades_df = pd.DataFrame(trades)
     trades_df['block_time'] = pd.to_datetime(trades_df['block_time'])
 
+    # 全局按时间稳定排序一次，之后各组内的交易天然有序，无需逐组排序
+    trades_df = trades_df.sort_values('block_time', kind='stable').reset_index(drop=True)
+
+    # 低基数字符串列转为 Categorical，groupby 按整数编码分组而不是逐行哈希字符串
+    for col in ('address', 'token_address', 'token_symbol', 'side'):
+        trades_df[col] = trades_df[col].astype('category')
+
     # 时间窗口定义
     time_windows = [
         ('1小时', timedelta(hours=1)),
@@ -658,159 +666,180 @@ def analyze_token_returns(addresses, wallets_df=None):
         ('30天', timedelta(days=30)),
     ]
 
-    # ---- 逐钱包-代币分析 ----
-    results = []
-    grouped = trades_df.groupby(['address', 'token_address'])
-    total_groups = len(grouped)
-    print(f"  分析 {total_groups} 个钱包-代币组合...")
-
-    skipped_swap = 0
-    processed = 0
-    for (address, token_address), group in grouped:
-        processed += 1
-        buys = group[group['side'] == 'buy'].sort_values('block_time')
-        sells = group[group['side'] == 'sell'].sort_values('block_time')
-
-        if buys.empty:
-            continue
-
-        first_buy_time = buys.iloc[0]['block_time']
-        last_sell_time = sells.iloc[-1]['block_time'] if not sells.empty else None
-        token_symbol = buys.iloc[0]['token_symbol']
-
-        # 过滤掉代币互换交易（成本无法可靠计算）
-        normal_buys = buys[~buys['is_token_swap']]
-        normal_sells = sells[~sells['is_token_swap']]
-
-        # 成本：仅来自非代币互换的买入（usd_amount 为负，取绝对值）
-        total_cost = abs(normal_buys['usd_amount'].sum()) if not normal_buys.empty else 0
-
-        # 如果所有买入都是代币互换，无法确定成本 → 跳过
-        if total_cost < 0.01:
-            skipped_swap += 1
-            continue
-
-        # 收入：仅来自非代币互换的卖出（usd_amount 为正）
-        total_revenue = normal_sells['usd_amount'].sum() if not normal_sells.empty else 0
-        total_return = (total_revenue - total_cost) / total_cost * 100
-
-        row = {
-            '钱包地址': address,
-            '代币符号': token_symbol,
-            '代币地址': token_address,
-            '首次买入时间': first_buy_time,
-            '最后卖出时间': last_sell_time,
-            '买入总成本': round(total_cost, 2),
-            '卖出总收入': round(total_revenue, 2),
-            '买入次数': len(buys),
-            '卖出次数': len(sells),
-            '总收益率(%)': round(total_return, 2),
-        }
-
-        # 不同时间窗口的收益率
-        for wname, wdelta in time_windows:
-            w_end = first_buy_time + wdelta
-
-            w_buys = normal_buys[normal_buys['block_time'] <= w_end]
-            w_sells = normal_sells[normal_sells['block_time'] <= w_end]
-
-            w_cost = abs(w_buys['usd_amount'].sum()) if not w_buys.empty else 0
-            w_rev = w_sells['usd_amount'].sum() if not w_sells.empty else 0
-
-            if w_cost > 0:
-                w_ret = (w_rev - w_cost) / w_cost * 100
-            else:
-                w_ret = 0.0
-
-            row[f'{wname}_收益率(%)'] = round(w_ret, 2)
-
-        results.append(row)
+    # ---- 逐钱包-代币分析（按组向量化聚合，不再逐组 Python 循环）----
+    keys = ['address', 'token_address']
+    is_buy = trades_df['side'] == 'buy'
+    is_sell = trades_df['side'] == 'sell'
+    is_normal = ~trades_df['is_token_swap'].astype(bool)
+
+    # 代币互换交易不计入成本/收入（成本无法可靠计算），次数和首末时间仍计入
+    trades_df['buy_usd'] = trades_df['usd_amount'].where(is_buy & is_normal, 0.0)
+    trades_df['sell_usd'] = trades_df['usd_amount'].where(is_sell & is_normal, 0.0)
+    trades_df['is_buy'] = is_buy
+    trades_df['is_sell'] = is_sell
+    trades_df['buy_time'] = trades_df['block_time'].where(is_buy)
+    trades_df['sell_time'] = trades_df['block_time'].where(is_sell)
+    # 已全局按时间排序，组内第一条买入的符号即首次买入的符号
+    trades_df['buy_symbol'] = trades_df['token_symbol'].where(is_buy)
+
+    grouped = trades_df.groupby(keys, observed=True)
+    n_groups = grouped.ngroups
+    print(f"  分析 {n_groups} 个钱包-代币组合...")
+
+    # 一次 agg 同时得到首末时间、符号、成本/收入和买卖次数
+    combo = grouped.agg(
+        first_buy=('buy_time', 'min'),
+        last_sell=('sell_time', 'max'),
+        token_symbol=('buy_symbol', 'first'),
+        buy_usd=('buy_usd', 'sum'),
+        sell_usd=('sell_usd', 'sum'),
+        n_buys=('is_buy', 'sum'),
+        n_sells=('is_sell', 'sum'),
+    )
 
-        if processed % 2000 == 0:
-            print(f"    已处理 {processed}/{total_groups} 组合")
+    # 时间窗口：以首次买入时间为起点，窗口内的成本/收入 = 组内前缀和在截止位置的差值
+    # 行按 (组编号, 时间) 重排后每组是一段连续区间，截止位置用 searchsorted 一次求出所有组；
+    # 排序键 = 组编号 * stride + 时间的稠密排名，保证跨组全局有序
+    # 时间统一转为 int64 纳秒，不创建 Timestamp
+    # （无买入的组合首次买入为 NaT，对应 int64 最小值，截止位置即区间起点，窗口和为 0）
+    gid = grouped.ngroup().to_numpy()
+    order = np.argsort(gid, kind='stable')  # 已全局按时间排序，组内仍保持时间顺序
+    block_ns = trades_df['block_time'].to_numpy(dtype='datetime64[ns]').view('int64')
+    uniq_ns, time_rank = np.unique(block_ns, return_inverse=True)
+    stride = len(uniq_ns) + 1
+    seg_key = gid[order].astype(np.int64) * stride + time_rank[order]
+    group_base = np.arange(n_groups, dtype=np.int64) * stride
+    seg_start = np.searchsorted(seg_key, group_base)
+
+    cum_buy = np.concatenate(([0.0], np.cumsum(trades_df['buy_usd'].to_numpy()[order])))
+    cum_sell = np.concatenate(([0.0], np.cumsum(trades_df['sell_usd'].to_numpy()[order])))
+    first_buy_ns = combo['first_buy'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+    for i, (_, wdelta) in enumerate(time_windows):
+        cutoff_rank = np.searchsorted(uniq_ns, first_buy_ns + pd.Timedelta(wdelta).value,
+                                      side='right')
+        seg_end = np.searchsorted(seg_key, group_base + cutoff_rank)
+        combo[f'w{i}_cost'] = cum_buy[seg_end] - cum_buy[seg_start]
+        combo[f'w{i}_rev'] = cum_sell[seg_end] - cum_sell[seg_start]
+
+    # 没有买入记录的组合直接丢弃
+    combo = combo[combo['first_buy'].notna()]
+
+    # 成本：仅来自非代币互换的买入（usd_amount 为负，取绝对值）
+    # 如果所有买入都是代币互换，无法确定成本 → 跳过
+    combo['total_cost'] = combo['buy_usd'].abs()
+    valid_cost = combo['total_cost'] >= 0.01
+    skipped_swap = int((~valid_cost).sum())
+    combo = combo[valid_cost].reset_index()
+
+    total_cost = combo['total_cost']
+    total_revenue = combo['sell_usd']
+    total_return = (total_revenue - total_cost) / total_cost * 100
 
     if skipped_swap > 0:
         print(f"  跳过 {skipped_swap} 个代币互换组合（成本无法确定）")
 
-    if not results:
+    if combo.empty:
         print("  无有效收益率数据")
         return None, None, None, None
 
-    detail_df = pd.DataFrame(results)
+    # 地址/符号列保持 Categorical 输出，下游重叠分析、30D 分析直接按整数编码分组
+    detail_df = pd.DataFrame({
+        '钱包地址': combo['address'],
+        '代币符号': combo['token_symbol'],
+        '代币地址': combo['token_address'],
+        '首次买入时间': combo['first_buy'],
+        '最后卖出时间': combo['last_sell'],
+        '买入总成本': total_cost.round(2),
+        '卖出总收入': total_revenue.round(2),
+        '买入次数': combo['n_buys'].astype(int),
+        '卖出次数': combo['n_sells'].astype(int),
+        '总收益率(%)': total_return.round(2),
+    })
+
+    # 不同时间窗口的收益率
+    for i, (wname, _) in enumerate(time_windows):
+        w_cost = combo[f'w{i}_cost'].abs()
+        w_rev = combo[f'w{i}_rev']
+        w_ret = ((w_rev - w_cost) / w_cost.where(w_cost > 0) * 100).fillna(0.0)
+        detail_df[f'{wname}_收益率(%)'] = w_ret.round(2)
+
     print(f"  生成 {len(detail_df)} 条持仓收益率记录")
 
-    # ---- 钱包收益汇总（每个钱包所有币种聚合）----
-    wallet_summary_rows = []
-    for addr, wgroup in detail_df.groupby('钱包地址'):
-        total_cost = wgroup['买入总成本'].sum()
-        total_rev = wgroup['卖出总收入'].sum()
-        total_pnl = total_rev - total_cost
-        total_return = (total_pnl / total_cost * 100) if total_cost > 0 else 0
-
-        profitable_tokens = len(wgroup[wgroup['总收益率(%)'] > 0])
-        losing_tokens = len(wgroup[wgroup['总收益率(%)'] < 0])
-        n_tokens = len(wgroup)
-
-        wallet_summary_rows.append({
-            '钱包地址': addr,
-            '交易币种数': n_tokens,
-            '总买入成本(USD)': round(total_cost, 2),
-            '总卖出收入(USD)': round(total_rev, 2),
-            '总盈亏(USD)': round(total_pnl, 2),
-            '总收益率(%)': round(total_return, 2),
-            '盈利币种数': profitable_tokens,
-            '亏损币种数': losing_tokens,
-            '盈利币种占比(%)': round(profitable_tokens / n_tokens * 100, 1) if n_tokens > 0 else 0,
-            '最佳币种收益率(%)': round(wgroup['总收益率(%)'].max(), 2),
-            '最差币种收益率(%)': round(wgroup['总收益率(%)'].min(), 2),
-        })
+    # ---- 钱包收益汇总（每个钱包所有币种聚合，单次扫描 numpy 数组）----
+    codes, wallet_addrs = pd.factorize(detail_df['钱包地址'], sort=True)
+    (total_cost, total_rev, n_tokens, profitable_tokens, losing_tokens,
+     best_return, worst_return) = _wallet_summary(
+        codes.astype(np.int64),
+        detail_df['买入总成本'].to_numpy(dtype=np.float64),
+        detail_df['卖出总收入'].to_numpy(dtype=np.float64),
+        detail_df['总收益率(%)'].to_numpy(dtype=np.float64),
+        len(wallet_addrs),
+    )
+    ws = pd.DataFrame({
+        '钱包地址': np.asarray(wallet_addrs, dtype=object),
+        'n_tokens': n_tokens,
+        'total_cost': total_cost,
+        'total_rev': total_rev,
+        'profitable_tokens': profitable_tokens,
+        'losing_tokens': losing_tokens,
+        'best_return': best_return,
+        'worst_return': worst_return,
+    })
+
+    total_pnl = ws['total_rev'] - ws['total_cost']
+    wallet_return = (total_pnl / ws['total_cost'].where(ws['total_cost'] > 0) * 100).fillna(0)
+
+    wallet_summary_df = pd.DataFrame({
+        '钱包地址': ws['钱包地址'],
+        '交易币种数': ws['n_tokens'],
+        '总买入成本(USD)': ws['total_cost'].round(2),
+        '总卖出收入(USD)': ws['total_rev'].round(2),
+        '总盈亏(USD)': total_pnl.round(2),
+        '总收益率(%)': wallet_return.round(2),
+        '盈利币种数': ws['profitable_tokens'],
+        '亏损币种数': ws['losing_tokens'],
+        '盈利币种占比(%)': (ws['profitable_tokens'] / ws['n_tokens'] * 100).round(1),
+        '最佳币种收益率(%)': ws['best_return'].round(2),
+        '最差币种收益率(%)': ws['worst_return'].round(2),
+    })
 
-    wallet_summary_df = pd.DataFrame(wallet_summary_rows)
+    # 钱包信息按地址建索引（每个地址一行），名称和平台标记都按地址直接映射，无需 merge
+    wallets_idx = None
+    if wallets_df is not None and not wallets_df.empty:
+        wallets_idx = wallets_df.drop_duplicates('address').set_index('address')
 
     # 合并钱包名称
-    if wallets_df is not None and not wallets_df.empty:
-        name_map = wallets_df[['address', 'name']].drop_duplicates()
-        wallet_summary_df = wallet_summary_df.merge(
-            name_map, left_on='钱包地址', right_on='address', how='left'
+    if wallets_idx is not None:
+        wallet_summary_df.insert(
+            1, '钱包名称', wallet_summary_df['钱包地址'].map(wallets_idx['name'])
         )
-        wallet_summary_df.rename(columns={'name': '钱包名称'}, inplace=True)
-        wallet_summary_df.drop(columns=['address'], inplace=True, errors='ignore')
-        cols = ['钱包地址', '钱包名称'] + [c for c in wallet_summary_df.columns
-                                            if c not in ['钱包地址', '钱包名称']]
-        wallet_summary_df = wallet_summary_df[cols]
 
     # 按总收益率降序排列
     wallet_summary_df = wallet_summary_df.sort_values('总收益率(%)', ascending=False)
     print(f"  生成 {len(wallet_summary_df)} 个钱包的收益汇总")
 
     # ---- 按时间窗口汇总（分位数）----
-    summary_rows = []
-
-    # 总体
-    n = len(detail_df)
+    # 每列的分位数和极值用一次 describe 求出；时间窗口只统计在该窗口内有交易的记录，
+    # 收益率为 0 的置为 NaN，describe 自动跳过，count 即样本数
     col_total = '总收益率(%)'
-    prof_total = detail_df[detail_df[col_total] > 0]
-    summary_rows.append({
-        '时间窗口': '总计(所有时间)',
-        '样本数': n,
-        '收益率_P10(%)': round(detail_df[col_total].quantile(0.10), 2),
-        '收益率_P25(%)': round(detail_df[col_total].quantile(0.25), 2),
-        '收益率_P50(中位数)(%)': round(detail_df[col_total].median(), 2),
-        '收益率_P75(%)': round(detail_df[col_total].quantile(0.75), 2),
-        '收益率_P90(%)': round(detail_df[col_total].quantile(0.90), 2),
-        '盈利比例(%)': round(len(prof_total) / n * 100, 1) if n > 0 else 0,
-        '最大收益率(%)': round(detail_df[col_total].max(), 2),
-        '最小收益率(%)': round(detail_df[col_total].min(), 2),
-    })
+    win_names = [wname for wname, _ in time_windows]
+    win_cols = [f'{wname}_收益率(%)' for wname in win_names]
+    percentiles = [0.10, 0.25, 0.50, 0.75, 0.90]
 
-    for wname, _ in time_windows:
-        col = f'{wname}_收益率(%)'
-        # 只统计在该时间窗口内有交易的记录
-        valid = detail_df[detail_df[col] != 0]
+    returns = detail_df[[col_total] + win_cols]
+    returns = returns.assign(**{c: returns[c].where(returns[c] != 0) for c in win_cols})
+    stats = returns.describe(percentiles=percentiles).T
+    stats['n_profit'] = (returns > 0).sum()
+
+    summary_rows = []
+    for label, col in [('总计(所有时间)', col_total)] + list(zip(win_names, win_cols)):
+        st = stats.loc[col]
+        n_valid = int(st['count'])
 
-        if valid.empty:
+        if n_valid == 0:
             summary_rows.append({
-                '时间窗口': wname,
+                '时间窗口': label,
                 '样本数': 0,
                 '收益率_P10(%)': 0,
                 '收益率_P25(%)': 0,
@@ -822,25 +851,24 @@ def analyze_token_returns(addresses, wallets_df=None):
                 '最小收益率(%)': 0,
             })
         else:
-            prof = valid[valid[col] > 0]
             summary_rows.append({
-                '时间窗口': wname,
-                '样本数': len(valid),
-                '收益率_P10(%)': round(valid[col].quantile(0.10), 2),
-                '收益率_P25(%)': round(valid[col].quantile(0.25), 2),
-                '收益率_P50(中位数)(%)': round(valid[col].median(), 2),
-                '收益率_P75(%)': round(valid[col].quantile(0.75), 2),
-                '收益率_P90(%)': round(valid[col].quantile(0.90), 2),
-                '盈利比例(%)': round(len(prof) / len(valid) * 100, 1),
-                '最大收益率(%)': round(valid[col].max(), 2),
-                '最小收益率(%)': round(valid[col].min(), 2),
+                '时间窗口': label,
+                '样本数': n_valid,
+                '收益率_P10(%)': round(st['10%'], 2),
+                '收益率_P25(%)': round(st['25%'], 2),
+                '收益率_P50(中位数)(%)': round(st['50%'], 2),
+                '收益率_P75(%)': round(st['75%'], 2),
+                '收益率_P90(%)': round(st['90%'], 2),
+                '盈利比例(%)': round(st['n_profit'] / n_valid * 100, 1),
+                '最大收益率(%)': round(st['max'], 2),
+                '最小收益率(%)': round(st['min'], 2),
             })
 
     summary_df = pd.DataFrame(summary_rows)
 
     # ---- 按平台分组的收益率（分位数）----
     platform_df = None
-    if wallets_df is not None and not wallets_df.empty:
+    if wallets_idx is not None:
         platforms = {
             'Trojan': 'uses_trojan',
             'BullX': 'uses_bullx',
@@ -848,42 +876,39 @@ def analyze_token_returns(addresses, wallets_df=None):
             'Axiom': 'uses_axiom',
         }
 
-        # 合并钱包平台信息
-        platform_cols = ['address'] + list(platforms.values())
-        merged = detail_df.merge(
-            wallets_df[platform_cols],
-            left_on='钱包地址', right_on='address', how='left'
-        )
+        # 一次取出每条明细对应钱包的全部平台标记，各平台只是一列布尔掩码
+        platform_flags = (wallets_idx[list(platforms.values())]
+                          .reindex(detail_df['钱包地址']).to_numpy() == 1)
 
         plat_rows = []
-        for pname, pcol in platforms.items():
-            pdata = merged[merged[pcol] == 1]
+        for k, pname in enumerate(platforms):
+            pdata = returns[platform_flags[:, k]]
             if pdata.empty:
                 continue
 
             n_p = len(pdata)
-            prof_p = pdata[pdata['总收益率(%)'] > 0]
+            pstats = pdata[[col_total] + win_cols].describe(percentiles=percentiles).T
+            pt = pstats.loc[col_total]
 
             prow = {
                 '平台': pname,
                 '交易对数': n_p,
                 # 总收益率 分位数
-                '总收益率_P10(%)': round(pdata['总收益率(%)'].quantile(0.10), 2),
-                '总收益率_P25(%)': round(pdata['总收益率(%)'].quantile(0.25), 2),
-                '总收益率_P50(%)': round(pdata['总收益率(%)'].median(), 2),
-                '总收益率_P75(%)': round(pdata['总收益率(%)'].quantile(0.75), 2),
-                '总收益率_P90(%)': round(pdata['总收益率(%)'].quantile(0.90), 2),
-                '盈利比例(%)': round(len(prof_p) / n_p * 100, 1),
+                '总收益率_P10(%)': round(pt['10%'], 2),
+                '总收益率_P25(%)': round(pt['25%'], 2),
+                '总收益率_P50(%)': round(pt['50%'], 2),
+                '总收益率_P75(%)': round(pt['75%'], 2),
+                '总收益率_P90(%)': round(pt['90%'], 2),
+                '盈利比例(%)': round((pdata[col_total] > 0).sum() / n_p * 100, 1),
             }
 
-            # 各时间窗口分位数
-            for wname, _ in time_windows:
-                col = f'{wname}_收益率(%)'
-                valid = pdata[pdata[col] != 0]
-                if not valid.empty:
-                    prow[f'{wname}_P25(%)'] = round(valid[col].quantile(0.25), 2)
-                    prow[f'{wname}_P50(%)'] = round(valid[col].median(), 2)
-                    prow[f'{wname}_P75(%)'] = round(valid[col].quantile(0.75), 2)
+            # 各时间窗口分位数（窗口列中 0 已置为 NaN，不参与统计）
+            for wname, col in zip(win_names, win_cols):
+                pw = pstats.loc[col]
+                if pw['count'] > 0:
+                    prow[f'{wname}_P25(%)'] = round(pw['25%'], 2)
+                    prow[f'{wname}_P50(%)'] = round(pw['50%'], 2)
+                    prow[f'{wname}_P75(%)'] = round(pw['75%'], 2)
                 else:
                     prow[f'{wname}_P25(%)'] = 0
                     prow[f'{wname}_P50(%)'] = 0
@@ -901,6 +926,14 @@ def analyze_token_returns(addresses, wallets_df=None):
 # 4.5 币种-钱包重叠分析
 # ============================================================
 
+def _wallet_name_map(wallets_df):
+    """构建 地址 → 钱包名称 映射（跳过空名称），直接在 numpy 数组上 zip，不逐行 iterrows"""
+    addr_arr = wallets_df['address'].to_numpy()
+    name_arr = wallets_df['name'].to_numpy()
+    mask = pd.notna(name_arr) & (name_arr != '')
+    return dict(zip(addr_arr[mask], name_arr[mask]))
+
+
 def analyze_token_wallet_overlap(detail_df, wallets_df=None):
     """
     分析哪些钱包共同买了同一个币
@@ -916,58 +949,61 @@ def analyze_token_wallet_overlap(detail_df, wallets_df=None):
     # 构建钱包名称映射
     name_map = {}
     if wallets_df is not None and not wallets_df.empty:
-        for _, row in wallets_df[['address', 'name']].iterrows():
-            if pd.notna(row['name']) and row['name']:
-                name_map[row['address']] = row['name']
-
-    # 按代币分组
-    token_groups = detail_df.groupby(['代币地址', '代币符号'])
-
-    summary_rows = []
-    detail_rows = []
-
-    for (token_addr, token_symbol), group in token_groups:
-        wallets = group['钱包地址'].unique()
-        n_wallets = len(wallets)
-
-        wallet_names = [name_map.get(w, '') for w in wallets]
-        wallet_names_clean = [n for n in wallet_names if n]
-
-        summary_rows.append({
-            '代币符号': token_symbol,
-            '代币地址': token_addr,
-            '买入钱包数': n_wallets,
-            '钱包名称列表': ', '.join(wallet_names_clean) if wallet_names_clean else '',
-            '钱包地址列表': ', '.join(wallets),
-            '总买入成本(USD)': round(group['买入总成本'].sum(), 2),
-            '总卖出收入(USD)': round(group['卖出总收入'].sum(), 2),
-            '总盈亏(USD)': round(group['卖出总收入'].sum() - group['买入总成本'].sum(), 2),
-        })
-
-        # 明细：每个钱包一行
-        for _, row in group.iterrows():
-            addr = row['钱包地址']
-            detail_rows.append({
-                '代币符号': token_symbol,
-                '代币地址': token_addr,
-                '买入钱包数(该币)': n_wallets,
-                '钱包地址': addr,
-                '钱包名称': name_map.get(addr, ''),
-                '首次买入时间': row['首次买入时间'],
-                '买入总成本(USD)': row['买入总成本'],
-                '卖出总收入(USD)': row['卖出总收入'],
-                '买入次数': row['买入次数'],
-                '卖出次数': row['卖出次数'],
-                '总收益率(%)': row['总收益率(%)'],
-            })
-
-    overlap_summary_df = pd.DataFrame(summary_rows).sort_values(
-        '买入钱包数', ascending=False
-    ).reset_index(drop=True)
+        name_map = _wallet_name_map(wallets_df)
+
+    # 按代币分组（分组键转为 Categorical，按整数编码分组）
+    token_keys = [detail_df['代币地址'].astype('category'),
+                  detail_df['代币符号'].astype('category')]
+    token_groups = detail_df.groupby(token_keys, observed=True)
+    wallet_names = detail_df['钱包地址'].map(name_map).astype(object).fillna('')
+
+    # 汇总：每个币种一行
+    summary = token_groups.agg(
+        n_wallets=('钱包地址', 'nunique'),
+        total_cost=('买入总成本', 'sum'),
+        total_rev=('卖出总收入', 'sum'),
+    )
 
-    overlap_detail_df = pd.DataFrame(detail_rows).sort_values(
-        ['买入钱包数(该币)', '代币符号', '首次买入时间'],
-        ascending=[False, True, True]
+    # 钱包列表按组内首次出现顺序去重拼接（一个钱包在同一币种下只有一行明细）
+    first_seen = ~detail_df.duplicated(['代币地址', '代币符号', '钱包地址'])
+    uniq_groups = detail_df[first_seen].groupby(
+        [key[first_seen] for key in token_keys], observed=True
+    )
+    addr_lists = uniq_groups['钱包地址'].agg(', '.join)
+    name_lists = wallet_names[first_seen].groupby(
+        [key[first_seen] for key in token_keys], observed=True
+    ).agg(lambda names: ', '.join(n for n in names if n))
+
+    summary = summary.reset_index(names=['代币地址', '代币符号'])
+    overlap_summary_df = pd.DataFrame({
+        '代币符号': summary['代币符号'].astype(object),
+        '代币地址': summary['代币地址'].astype(object),
+        '买入钱包数': summary['n_wallets'],
+        '钱包名称列表': name_lists.to_numpy(),
+        '钱包地址列表': addr_lists.to_numpy(),
+        '总买入成本(USD)': summary['total_cost'].round(2),
+        '总卖出收入(USD)': summary['total_rev'].round(2),
+        '总盈亏(USD)': (summary['total_rev'] - summary['total_cost']).round(2),
+    }).sort_values('买入钱包数', ascending=False).reset_index(drop=True)
+
+    # 明细：每个钱包一行，直接在明细表上广播该币的钱包数
+    overlap_detail_df = pd.DataFrame({
+        '代币符号': detail_df['代币符号'],
+        '代币地址': detail_df['代币地址'],
+        '买入钱包数(该币)': token_groups['钱包地址'].transform('nunique'),
+        '钱包地址': detail_df['钱包地址'],
+        '钱包名称': wallet_names,
+        '首次买入时间': detail_df['首次买入时间'],
+        '买入总成本(USD)': detail_df['买入总成本'],
+        '卖出总收入(USD)': detail_df['卖出总收入'],
+        '买入次数': detail_df['买入次数'],
+        '卖出次数': detail_df['卖出次数'],
+        '总收益率(%)': detail_df['总收益率(%)'],
+    })
+    # 以代币地址作为最后的排序键，并列时与按币种分组后输出的顺序一致
+    overlap_detail_df = overlap_detail_df.sort_values(
+        ['买入钱包数(该币)', '代币符号', '首次买入时间', '代币地址'],
+        ascending=[False, True, True, True], kind='stable'
     ).reset_index(drop=True)
 
     multi_count = len(overlap_summary_df[overlap_summary_df['买入钱包数'] >= 2])
@@ -981,6 +1017,107 @@ def analyze_token_wallet_overlap(detail_df, wallets_df=None):
 # 5. 基于30D高收益钱包的深度分析
 # ============================================================
 
+# SWAR popcount 常量（uint64，避免 Numba 中与 int64 混算被提升为 float）
+_POP_M1 = np.uint64(0x5555555555555555)
+_POP_M2 = np.uint64(0x3333333333333333)
+_POP_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_POP_H01 = np.uint64(0x0101010101010101)
+
+
+def _popcount64(x):
+    """uint64 中置位的个数（SWAR 算法，供 Numba 编译）"""
+    x = x - ((x >> np.uint64(1)) & _POP_M1)
+    x = (x & _POP_M2) + ((x >> np.uint64(2)) & _POP_M2)
+    x = (x + (x >> np.uint64(4))) & _POP_M4
+    return (x * _POP_H01) >> np.uint64(56)
+
+
+def _pair_overlap_loop(bits):
+    """
+    逐对统计按位打包的币种集合的交集/并集大小（供 Numba 并行编译）
+
+    bits: uint64 矩阵 [钱包, 字]，每位表示是否持有某币种
+    返回按上三角 (i<j) 行优先顺序排列的 inter / union
+    """
+    n = bits.shape[0]
+    n_words = bits.shape[1]
+    n_pairs = n * (n - 1) // 2
+    inter = np.zeros(n_pairs, dtype=np.int64)
+    union = np.zeros(n_pairs, dtype=np.int64)
+
+    for i in prange(n):
+        base = i * (2 * n - i - 1) // 2  # (i, i+1) 在上三角中的下标
+        for j in range(i + 1, n):
+            c = np.uint64(0)
+            u = np.uint64(0)
+            for w in range(n_words):
+                c += _popcount64(bits[i, w] & bits[j, w])
+                u += _popcount64(bits[i, w] | bits[j, w])
+            inter[base + j - i - 1] = c
+            union[base + j - i - 1] = u
+
+    return inter, union
+
+
+if njit is not None:
+    _popcount64 = njit(cache=True)(_popcount64)
+    _pair_overlap_kernel = njit(cache=True, parallel=True)(_pair_overlap_loop)
+else:
+    _pair_overlap_kernel = None
+
+
+def _pair_overlap_sparse(member):
+    """
+    用倒排索引（币种 -> 持有钱包）统计所有钱包对的交集大小
+
+    只枚举至少共同持有一个币种的钱包对，工作量为 sum(C(持有数, 2))，
+    其余钱包对交集为 0；返回按上三角 (i<j) 行优先顺序排列的 inter
+    """
+    n = member.shape[0]
+    n_pairs = n * (n - 1) // 2
+    # 按 (币种, 钱包) 升序列出所有持有关系，同一币种的持有钱包是连续的一段
+    tok, wal = np.nonzero(member.T)
+    max_owners = int(member.sum(axis=0).max(initial=0))
+    pair_ids = []
+    # 同一币种内相隔 k 个位置的两个钱包构成一对 (i<j)
+    for k in range(1, max_owners):
+        same = tok[k:] == tok[:-k]
+        i, j = wal[:-k][same], wal[k:][same]
+        pair_ids.append(i * (2 * n - i - 1) // 2 + j - i - 1)
+    if not pair_ids:
+        return np.zeros(n_pairs, dtype=np.int64)
+    return np.bincount(np.concatenate(pair_ids), minlength=n_pairs).astype(np.int64)
+
+
+def _pair_token_overlap(member):
+    """
+    计算所有钱包对的币种交集/并集大小
+
+    member: bool 矩阵 [钱包, 币种]
+    返回 (pair_i, pair_j, inter, union)，按上三角 (i<j) 行优先顺序
+    """
+    n = member.shape[0]
+    pair_i, pair_j = np.triu_indices(n, k=1)
+
+    # 钱包-币种关系通常很稀疏：按倒排索引只枚举有共同币种的钱包对；
+    # 仅当共同持有的组合数超过逐对按位比较的工作量时才走 Numba 稠密内核
+    owners = member.sum(axis=0).astype(np.int64)
+    sparse_work = int((owners * (owners - 1) // 2).sum())
+    dense_work = len(pair_i) * ((member.shape[1] + 63) // 64)
+
+    if _pair_overlap_kernel is not None and sparse_work > dense_work:
+        packed = np.packbits(member, axis=1, bitorder='little')
+        packed = np.pad(packed, ((0, 0), (0, (-packed.shape[1]) % 8)))
+        inter, union = _pair_overlap_kernel(np.ascontiguousarray(packed).view(np.uint64))
+    else:
+        # 并集 = 两边币种数之和 - 交集
+        inter = _pair_overlap_sparse(member)
+        n_tokens = member.sum(axis=1).astype(np.int64)
+        union = n_tokens[pair_i] + n_tokens[pair_j] - inter
+
+    return pair_i, pair_j, inter, union
+
+
 def analyze_30d_smart_money(detail_df, wallets_df):
     """
     基于30D高收益钱包的深度分析
@@ -1005,7 +1142,7 @@ def analyze_30d_smart_money(detail_df, wallets_df):
     results = {}
 
     # ---- 1. 筛选30D高收益钱包 (pnl_30d > 0) ----
-    high_profit = wallets_df[wallets_df['pnl_30d'] > 0].copy()
+    high_profit = wallets_df[wallets_df['pnl_30d'] > 0]
     high_profit = high_profit.sort_values('pnl_30d', ascending=False)
 
     if high_profit.empty:
@@ -1017,30 +1154,32 @@ def analyze_30d_smart_money(detail_df, wallets_df):
         print(f"  30D高收益钱包 {len(high_profit)} 个，取PnL前200名分析")
         high_profit = high_profit.head(200)
 
-    hp_addrs = set(high_profit['address'].unique())
+    hp_addrs = pd.Index(high_profit['address'].unique())
     print(f"  30D高收益钱包: {len(hp_addrs)} 个")
 
     # 输出高收益钱包概览
     hp_overview = high_profit[['address', 'name', 'pnl_30d', 'win_rate_30d',
                                 'tx_count_30d', 'avg_hold_time_30d',
-                                'balance', 'sol_balance']].copy()
-    hp_overview.rename(columns={
+                                'balance', 'sol_balance']]
+    hp_overview = hp_overview.rename(columns={
         'address': '钱包地址', 'name': '钱包名称',
         'pnl_30d': '30D_PnL(USD)', 'win_rate_30d': '30D_胜率(%)',
         'tx_count_30d': '30D_交易次数', 'avg_hold_time_30d': '30D_平均持仓(秒)',
         'balance': '余额(USD)', 'sol_balance': 'SOL余额',
-    }, inplace=True)
+    })
     hp_overview = hp_overview.sort_values('30D_PnL(USD)', ascending=False).reset_index(drop=True)
     results['smart_wallet_overview'] = hp_overview
 
     # 构建钱包名称映射
-    name_map = {}
-    for _, row in wallets_df[['address', 'name']].iterrows():
-        if pd.notna(row['name']) and row['name']:
-            name_map[row['address']] = row['name']
-
-    # 过滤 detail_df 只保留高收益钱包
-    hp_detail = detail_df[detail_df['钱包地址'].isin(hp_addrs)].copy()
+    name_map = _wallet_name_map(wallets_df)
+
+    # 过滤 detail_df 只保留高收益钱包，并只取后续用到的列；
+    # 钱包/代币地址转为 category，之后的分组、isin 都在整数编码上进行
+    detail_cols = ['钱包地址', '代币地址', '代币符号', '总收益率(%)',
+                   '买入总成本', '卖出总收入', '首次买入时间', '最后卖出时间',
+                   '买入次数', '卖出次数']
+    hp_detail = detail_df.loc[detail_df['钱包地址'].isin(hp_addrs), detail_cols]
+    hp_detail = hp_detail.astype({'钱包地址': 'category', '代币地址': 'category'})
     if hp_detail.empty:
         print("  高收益钱包无交易明细数据")
         return results
@@ -1049,7 +1188,7 @@ def analyze_30d_smart_money(detail_df, wallets_df):
     token_sym_map = dict(zip(detail_df['代币地址'], detail_df['代币符号']))
 
     # ---- 2. Top10 收益率最高的币种 ----
-    token_stats = hp_detail.groupby(['代币地址', '代币符号']).agg(
+    token_stats = hp_detail.groupby(['代币地址', '代币符号'], observed=True).agg(
         平均收益率=('总收益率(%)', 'mean'),
         中位收益率=('总收益率(%)', 'median'),
         最高收益率=('总收益率(%)', 'max'),
@@ -1063,8 +1202,11 @@ def analyze_30d_smart_money(detail_df, wallets_df):
     if len(qualified) < 10:
         qualified = token_stats  # 不够则放宽限制
 
-    top10 = qualified.sort_values('平均收益率', ascending=False).head(10).copy()
-    top10['总盈亏(USD)'] = round(top10['总卖出收入'] - top10['总买入成本'], 2)
+    top10 = top_n_rows(qualified, '平均收益率', 10)
+    # assign 返回新表，不写回 qualified 的切片，无需先 .copy()
+    top10 = top10.assign(**{
+        '总盈亏(USD)': (top10['总卖出收入'] - top10['总买入成本']).round(2),
+    })
     top10 = top10.rename(columns={
         '平均收益率': '平均收益率(%)',
         '中位收益率': '中位收益率(%)',
@@ -1072,57 +1214,60 @@ def analyze_30d_smart_money(detail_df, wallets_df):
         '总买入成本': '总买入成本(USD)',
         '总卖出收入': '总卖出收入(USD)',
     })
-    # 四舍五入
-    for col in ['平均收益率(%)', '中位收益率(%)', '最高收益率(%)', '总买入成本(USD)', '总卖出收入(USD)']:
-        top10[col] = top10[col].round(2)
+    # 四舍五入（DataFrame.round 按列字典一次处理）
+    top10 = top10.round({col: 2 for col in ['平均收益率(%)', '中位收益率(%)', '最高收益率(%)',
+                                            '总买入成本(USD)', '总卖出收入(USD)']})
 
     top10.insert(0, '排名', range(1, len(top10) + 1))
     top10 = top10.reset_index(drop=True)
     results['smart_top10_tokens'] = top10
 
-    top10_addrs = set(top10['代币地址'].tolist())
+    top10_addrs = pd.Index(top10['代币地址'], dtype=object)
     top10_sym_map = dict(zip(top10['代币地址'], top10['代币符号']))
     print(f"  Top10高收益币种: {', '.join(top10['代币符号'].tolist())}")
 
     # ---- 3. 每个钱包买到 Top10 中几个币 ----
-    hp_top10 = hp_detail[hp_detail['代币地址'].isin(top10_addrs)].copy()
+    hp_top10 = hp_detail[hp_detail['代币地址'].isin(top10_addrs)]
     if hp_top10.empty:
         print("  高收益钱包未交易任何Top10币种")
         return results
 
-    wallet_coverage = hp_top10.groupby('钱包地址').agg(
+    wallet_coverage = hp_top10.groupby('钱包地址', observed=True).agg(
         买到Top10币种数=('代币地址', 'nunique'),
         Top10平均收益率=('总收益率(%)', 'mean'),
         Top10总买入成本=('买入总成本', 'sum'),
         Top10总卖出收入=('卖出总收入', 'sum'),
     ).reset_index()
-    wallet_coverage['Top10总盈亏(USD)'] = round(
-        wallet_coverage['Top10总卖出收入'] - wallet_coverage['Top10总买入成本'], 2
-    )
+    wallet_coverage['钱包地址'] = wallet_coverage['钱包地址'].astype(object)
+    wallet_coverage['Top10总盈亏(USD)'] = (
+        wallet_coverage['Top10总卖出收入'] - wallet_coverage['Top10总买入成本']
+    ).round(2)
     wallet_coverage['钱包名称'] = wallet_coverage['钱包地址'].map(name_map).fillna('')
 
-    # 合并30D指标
-    w_info = wallets_df[['address', 'pnl_30d', 'win_rate_30d']].copy()
-    wallet_coverage = wallet_coverage.merge(
-        w_info, left_on='钱包地址', right_on='address', how='left'
-    )
-    wallet_coverage.drop(columns=['address'], inplace=True, errors='ignore')
-    wallet_coverage.rename(columns={
-        'pnl_30d': '30D_PnL(USD)', 'win_rate_30d': '30D_胜率(%)',
+    # 30D指标：按地址索引直接 map，不做整表 merge
+    w_info = wallets_df.drop_duplicates('address').set_index('address')
+    wallet_coverage['30D_PnL(USD)'] = wallet_coverage['钱包地址'].map(w_info['pnl_30d'])
+    wallet_coverage['30D_胜率(%)'] = wallet_coverage['钱包地址'].map(w_info['win_rate_30d'])
+    wallet_coverage = wallet_coverage.rename(columns={
         'Top10平均收益率': 'Top10平均收益率(%)',
         'Top10总买入成本': 'Top10总买入成本(USD)',
         'Top10总卖出收入': 'Top10总卖出收入(USD)',
-    }, inplace=True)
+    })
 
-    # 每个 Top10 币种加一列标记是否买入
-    for token_addr in top10_addrs:
-        sym = top10_sym_map.get(token_addr, token_addr[:8])
-        bought_set = set(
-            hp_top10[hp_top10['代币地址'] == token_addr]['钱包地址'].unique()
-        )
-        wallet_coverage[sym] = wallet_coverage['钱包地址'].apply(
-            lambda x, bs=bought_set: '✓' if x in bs else ''
-        )
+    # 每个 Top10 币种加一列标记是否买入（一次 crosstab 得到 钱包×币种 的买入矩阵）
+    bought = pd.crosstab(hp_top10['钱包地址'], hp_top10['代币地址']).reindex(
+        index=wallet_coverage['钱包地址'], columns=top10_addrs, fill_value=0
+    ).to_numpy() > 0
+    marks = pd.DataFrame(
+        np.where(bought, '✓', ''),
+        columns=[top10_sym_map.get(t, t[:8]) for t in top10_addrs],
+        index=wallet_coverage.index,
+    )
+    # 符号重名时保留最后一个（与逐列赋值的覆盖行为一致）
+    marks = marks.loc[:, ~marks.columns.duplicated(keep='last')]
+    wallet_coverage = pd.concat(
+        [wallet_coverage.drop(columns=marks.columns, errors='ignore'), marks], axis=1
+    )
 
     # 列排序
     base_cols = ['钱包地址', '钱包名称', '买到Top10币种数',
@@ -1134,104 +1279,118 @@ def analyze_30d_smart_money(detail_df, wallets_df):
     wallet_coverage = wallet_coverage.sort_values(
         '买到Top10币种数', ascending=False
     ).reset_index(drop=True)
-    # 四舍五入
-    for col in ['Top10平均收益率(%)', 'Top10总买入成本(USD)', 'Top10总卖出收入(USD)']:
-        if col in wallet_coverage.columns:
-            wallet_coverage[col] = wallet_coverage[col].round(4)
+    # 四舍五入（不存在的列 DataFrame.round 会自动忽略）
+    wallet_coverage = wallet_coverage.round(
+        {col: 4 for col in ['Top10平均收益率(%)', 'Top10总买入成本(USD)', 'Top10总卖出收入(USD)']}
+    )
 
     results['smart_wallet_top10_coverage'] = wallet_coverage
     print(f"  {len(wallet_coverage)} 个钱包交易了Top10币种")
 
     # ---- 4. 按 Top10 币分组，各钱包在该币上的收益率 ----
-    token_wallet_rows = []
-    for _, trow in top10.iterrows():
-        token_addr = trow['代币地址']
-        token_sym = trow['代币符号']
-        rank = trow['排名']
-
-        tdata = hp_detail[hp_detail['代币地址'] == token_addr].sort_values(
-            '总收益率(%)', ascending=False
-        )
-        for _, r in tdata.iterrows():
-            addr = r['钱包地址']
-            token_wallet_rows.append({
-                'Top10排名': rank,
-                '代币符号': token_sym,
-                '代币地址': token_addr,
-                '钱包地址': addr,
-                '钱包名称': name_map.get(addr, ''),
-                '首次买入时间': r['首次买入时间'],
-                '最后卖出时间': r.get('最后卖出时间', None),
-                '买入总成本(USD)': round(r['买入总成本'], 2),
-                '卖出总收入(USD)': round(r['卖出总收入'], 2),
-                '总收益率(%)': r['总收益率(%)'],
-                '买入次数': r['买入次数'],
-                '卖出次数': r['卖出次数'],
-            })
-
-    token_wallet_df = pd.DataFrame(token_wallet_rows)
+    # 全表按 (代币编码, 收益率降序) 一次稳定排序，每个币种是其中连续的一段，
+    # 各币种只按编码切出行下标，最后一次性取出各列构建 DataFrame
+    token_cat = hp_detail['代币地址'].cat
+    token_codes = token_cat.codes.to_numpy()
+    order = np.lexsort((-hp_detail['总收益率(%)'].to_numpy(), token_codes))
+    sorted_codes = token_codes[order]
+    row_parts, rank_parts, sym_parts, addr_parts = [], [], [], []
+    for rank, token_addr, token_sym in zip(top10['排名'], top10['代币地址'], top10['代币符号']):
+        code = token_cat.categories.get_loc(token_addr)
+        lo, hi = np.searchsorted(sorted_codes, [code, code + 1])
+        pos = order[lo:hi]
+        row_parts.append(pos)
+        rank_parts.append(np.full(len(pos), rank))
+        sym_parts.append(np.full(len(pos), token_sym, dtype=object))
+        addr_parts.append(np.full(len(pos), token_addr, dtype=object))
+
+    tw = hp_detail.take(np.concatenate(row_parts))
+    tw_wallets = tw['钱包地址'].to_numpy(dtype=object)
+    token_wallet_df = pd.DataFrame({
+        'Top10排名': np.concatenate(rank_parts),
+        '代币符号': np.concatenate(sym_parts),
+        '代币地址': np.concatenate(addr_parts),
+        '钱包地址': tw_wallets,
+        '钱包名称': [name_map.get(w, '') for w in tw_wallets],
+        '首次买入时间': tw['首次买入时间'].to_numpy(),
+        '最后卖出时间': tw['最后卖出时间'].to_numpy(),
+        '买入总成本(USD)': tw['买入总成本'].round(2).to_numpy(),
+        '卖出总收入(USD)': tw['卖出总收入'].round(2).to_numpy(),
+        '总收益率(%)': tw['总收益率(%)'].to_numpy(),
+        '买入次数': tw['买入次数'].to_numpy(),
+        '卖出次数': tw['卖出次数'].to_numpy(),
+    })
     results['smart_top10_wallet_returns'] = token_wallet_df
     print(f"  Top10币种-钱包收益明细: {len(token_wallet_df)} 条")
 
-    # ---- 5. 买卖时间相似性分析 ----
-    # 构建每个钱包在 Top10 币种上的买入/卖出时间
-    wallet_timing = {}
-    for addr in hp_top10['钱包地址'].unique():
-        w_data = hp_top10[hp_top10['钱包地址'] == addr]
-        timing = {}
-        for _, r in w_data.iterrows():
-            fb = r['首次买入时间']
-            ls = r.get('最后卖出时间', None)
-            timing[r['代币地址']] = {
-                'first_buy': pd.Timestamp(fb) if pd.notna(fb) else None,
-                'last_sell': pd.Timestamp(ls) if pd.notna(ls) else None,
-            }
-        wallet_timing[addr] = timing
-
-    timing_rows = []
-    wallet_list = list(wallet_timing.keys())
-
-    for i in range(len(wallet_list)):
-        for j in range(i + 1, len(wallet_list)):
-            w1, w2 = wallet_list[i], wallet_list[j]
-            t1, t2 = wallet_timing[w1], wallet_timing[w2]
+    # ---- 钱包对公共结构（第5、6部分共用，只构建一次）----
+    # 高收益钱包按 PnL 顺序编号；钱包 × 币种 成员矩阵与所有钱包对 (i<j) 的交集/并集
+    # 由 _pair_token_overlap 一次算出，时间相似性与行为相似性在同一组钱包对上筛选
+    feat_df = hp_detail.assign(
+        _prof=(hp_detail['总收益率(%)'] > 0).astype(np.int64)
+    ).groupby('钱包地址', sort=False, observed=True).agg(
+        n_tokens=('代币地址', 'size'),
+        total_cost=('买入总成本', 'sum'),
+        profitable_n=('_prof', 'sum'),
+    )
+    feat_df = feat_df.reindex(hp_addrs[hp_addrs.isin(feat_df.index)])
+    addr_arr = feat_df.index.to_numpy(dtype=object)
+    name_arr = np.array([name_map.get(a, '') for a in addr_arr], dtype=object)
 
-            common_tokens = set(t1.keys()) & set(t2.keys())
-            if len(common_tokens) < 2:
-                continue
+    tok_codes, tok_uniques = pd.factorize(hp_detail['代币地址'])
+    member = np.zeros((len(feat_df), len(tok_uniques)), dtype=bool)
+    member[feat_df.index.get_indexer(hp_detail['钱包地址']), tok_codes] = True
+    pair_i, pair_j, inter, union = _pair_token_overlap(member)
 
-            buy_diffs = []
-            sell_diffs = []
-            for tok in common_tokens:
-                b1, b2 = t1[tok]['first_buy'], t2[tok]['first_buy']
-                if b1 is not None and b2 is not None:
-                    buy_diffs.append(abs((b1 - b2).total_seconds()) / 3600)
-
-                s1, s2 = t1[tok].get('last_sell'), t2[tok].get('last_sell')
-                if s1 is not None and s2 is not None:
-                    sell_diffs.append(abs((s1 - s2).total_seconds()) / 3600)
-
-            avg_buy_diff = round(np.mean(buy_diffs), 2) if buy_diffs else None
-            max_buy_diff = round(max(buy_diffs), 2) if buy_diffs else None
-            avg_sell_diff = round(np.mean(sell_diffs), 2) if sell_diffs else None
-            max_sell_diff = round(max(sell_diffs), 2) if sell_diffs else None
-
-            timing_rows.append({
-                '钱包1地址': w1,
-                '钱包1名称': name_map.get(w1, ''),
-                '钱包2地址': w2,
-                '钱包2名称': name_map.get(w2, ''),
-                '共同Top10币种数': len(common_tokens),
-                '共同买入币种': ', '.join(
-                    [top10_sym_map.get(t, t[:8]) for t in common_tokens]
-                ),
-                '平均买入时差(小时)': avg_buy_diff,
-                '最大买入时差(小时)': max_buy_diff,
-                '平均卖出时差(小时)': avg_sell_diff,
-                '最大卖出时差(小时)': max_sell_diff,
-            })
-
-    timing_df = pd.DataFrame(timing_rows)
+    # ---- 5. 买卖时间相似性分析 ----
+    # 钱包 × Top10币种 的首次买入/最后卖出时间矩阵（int64 纳秒，缺失为 NaT），
+    # 时间列整列一次转成 int64，再按 (钱包, 币种) 下标直接填入矩阵；
+    # Top10 持有矩阵即成员矩阵中 Top10 币种的列
+    top10_list = top10_addrs.to_numpy()
+    held = member[:, pd.Index(tok_uniques).get_indexer(top10_addrs)]
+    w_codes = feat_df.index.get_indexer(hp_top10['钱包地址'])
+    t_codes = top10_addrs.get_indexer(hp_top10['代币地址'])
+    nat = np.datetime64('NaT').view('int64')
+    buy_ns, sell_ns = (np.full((len(feat_df), len(top10_list)), nat, dtype=np.int64)
+                       for _ in range(2))
+    buy_ns[w_codes, t_codes] = pd.to_datetime(
+        hp_top10['首次买入时间'], errors='coerce').to_numpy(dtype='datetime64[ns]').view('int64')
+    sell_ns[w_codes, t_codes] = pd.to_datetime(
+        hp_top10['最后卖出时间'], errors='coerce').to_numpy(dtype='datetime64[ns]').view('int64')
+
+    # 共同 Top10 币种数 >= 2 的钱包对
+    common_top10 = held[pair_i] & held[pair_j]
+    timing_keep = common_top10.sum(axis=1) >= 2
+    ti, tj = pair_i[timing_keep], pair_j[timing_keep]
+    common = common_top10[timing_keep]
+
+    def _pair_diff_hours(t_ns):
+        """逐对、逐币种的时差（小时）；两边都有时间才计入，返回 (平均, 最大)，无数据为 NaN"""
+        a, b = t_ns[ti], t_ns[tj]
+        valid = common & (a != nat) & (b != nat)
+        diff = np.where(valid, np.abs(a - b), 0) / 1e9 / 3600
+        n_valid = valid.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.where(n_valid > 0, diff.sum(axis=1) / n_valid, np.nan)
+        mx = np.where(n_valid > 0, np.where(valid, diff, -np.inf).max(axis=1, initial=-np.inf), np.nan)
+        return np.round(avg, 2), np.round(mx, 2)
+
+    avg_buy_diff, max_buy_diff = _pair_diff_hours(buy_ns)
+    avg_sell_diff, max_sell_diff = _pair_diff_hours(sell_ns)
+
+    top10_syms = np.array([top10_sym_map.get(t, t[:8]) for t in top10_list], dtype=object)
+    timing_df = pd.DataFrame({
+        '钱包1地址': addr_arr[ti],
+        '钱包1名称': name_arr[ti],
+        '钱包2地址': addr_arr[tj],
+        '钱包2名称': name_arr[tj],
+        '共同Top10币种数': common.sum(axis=1),
+        '共同买入币种': [', '.join(top10_syms[row]) for row in common],
+        '平均买入时差(小时)': avg_buy_diff,
+        '最大买入时差(小时)': max_buy_diff,
+        '平均卖出时差(小时)': avg_sell_diff,
+        '最大卖出时差(小时)': max_sell_diff,
+    })
     if not timing_df.empty:
         timing_df = timing_df.sort_values(
             ['共同Top10币种数', '平均买入时差(小时)'],
@@ -1241,95 +1400,65 @@ def analyze_30d_smart_money(detail_df, wallets_df):
     print(f"  买卖时间相似性: {len(timing_df)} 个钱包对（共同Top10>=2）")
 
     # ---- 6. 钱包行为相似性分析 ----
-    # 为每个高收益钱包构建行为特征向量
-    features = []
-    for addr in hp_addrs:
-        w_detail = hp_detail[hp_detail['钱包地址'] == addr]
-        if w_detail.empty:
-            continue
-
-        n_tokens = len(w_detail)
-        profitable_n = len(w_detail[w_detail['总收益率(%)'] > 0])
-
-        feature = {
-            'address': addr,
-            'name': name_map.get(addr, ''),
-            'n_tokens': n_tokens,
-            'avg_return': round(w_detail['总收益率(%)'].mean(), 2),
-            'total_cost': w_detail['买入总成本'].sum(),
-            'win_rate': round(profitable_n / n_tokens * 100, 1) if n_tokens > 0 else 0,
-            'avg_buy_count': round(w_detail['买入次数'].mean(), 1),
-            'avg_sell_count': round(w_detail['卖出次数'].mean(), 1),
-            'token_set': set(w_detail['代币地址'].tolist()),
-        }
-
-        w_info_row = wallets_df[wallets_df['address'] == addr]
-        if not w_info_row.empty:
-            feature['pnl_30d'] = w_info_row.iloc[0].get('pnl_30d', 0)
-            feature['win_rate_30d'] = w_info_row.iloc[0].get('win_rate_30d', 0)
-            feature['tx_count_30d'] = w_info_row.iloc[0].get('tx_count_30d', 0)
-        else:
-            feature['pnl_30d'] = 0
-            feature['win_rate_30d'] = 0
-            feature['tx_count_30d'] = 0
-
-        features.append(feature)
-
-    # 两两比较行为相似性
-    behavior_rows = []
-    for i in range(len(features)):
-        for j in range(i + 1, len(features)):
-            f1, f2 = features[i], features[j]
-
-            # 币种重叠度（Jaccard 相似系数）
-            common = f1['token_set'] & f2['token_set']
-            union = f1['token_set'] | f2['token_set']
-            jaccard = len(common) / len(union) if union else 0
-
-            # 仓位相似度（总成本比值）
-            max_cost = max(f1['total_cost'], f2['total_cost'])
-            cost_sim = (min(f1['total_cost'], f2['total_cost']) / max_cost
-                        if max_cost > 0 else 0)
-
-            # 胜率相似度
-            wr_diff = abs(f1['win_rate'] - f2['win_rate'])
-            wr_sim = max(0, 1 - wr_diff / 100)
-
-            # 综合相似度 = 40%币种重叠 + 30%仓位相似 + 30%胜率相似
-            score = jaccard * 0.4 + cost_sim * 0.3 + wr_sim * 0.3
-
-            if score < 0.3:
-                continue  # 过滤掉相似度太低的
-
-            # 共同币种符号（最多显示10个）
-            common_syms = [token_sym_map.get(t, t[:8]) for t in list(common)[:10]]
-            if len(common) > 10:
-                common_syms.append(f'...等{len(common)}个')
-
-            behavior_rows.append({
-                '钱包1地址': f1['address'],
-                '钱包1名称': f1['name'],
-                '钱包2地址': f2['address'],
-                '钱包2名称': f2['name'],
-                '综合相似度': round(score, 3),
-                '币种重叠度(Jaccard)': round(jaccard, 3),
-                '共同币种数': len(common),
-                '共同币种': ', '.join(common_syms),
-                '仓位相似度': round(cost_sim, 3),
-                '钱包1胜率(%)': f1['win_rate'],
-                '钱包2胜率(%)': f2['win_rate'],
-                '胜率差(%)': round(wr_diff, 1),
-                '钱包1总成本(USD)': round(f1['total_cost'], 2),
-                '钱包2总成本(USD)': round(f2['total_cost'], 2),
-                '钱包1交易币种数': f1['n_tokens'],
-                '钱包2交易币种数': f2['n_tokens'],
-                '钱包1_30D_PnL': round(f1['pnl_30d'], 2),
-                '钱包2_30D_PnL': round(f2['pnl_30d'], 2),
-                '钱包1_30D_胜率(%)': round(f1['win_rate_30d'], 2),
-                '钱包2_30D_胜率(%)': round(f2['win_rate_30d'], 2),
-            })
-
-    behavior_df = pd.DataFrame(behavior_rows)
+    # 行为特征：总成本、胜率（来自上面的一次分组聚合）
+    total_cost = feat_df['total_cost'].to_numpy(dtype=np.float64)
+    win_rate = (feat_df['profitable_n'] / feat_df['n_tokens'] * 100).round(1).to_numpy(dtype=np.float64)
+
+    # 币种重叠度（Jaccard 相似系数）
+    jaccard = np.where(union > 0, inter / np.maximum(union, 1), 0.0)
+
+    # 仓位相似度（总成本比值）
+    c1, c2 = total_cost[pair_i], total_cost[pair_j]
+    max_cost = np.maximum(c1, c2)
+    cost_sim = np.where(max_cost > 0, np.minimum(c1, c2) / np.where(max_cost > 0, max_cost, 1), 0.0)
+
+    # 胜率相似度
+    wr_diff = np.abs(win_rate[pair_i] - win_rate[pair_j])
+    wr_sim = np.maximum(0, 1 - wr_diff / 100)
+
+    # 综合相似度 = 40%币种重叠 + 30%仓位相似 + 30%胜率相似，过滤掉相似度太低的
+    score = jaccard * 0.4 + cost_sim * 0.3 + wr_sim * 0.3
+    keep = score >= 0.3
+
+    # 只为保留下来的钱包对取出各列，按列构建 DataFrame
+    kept = np.flatnonzero(keep)
+    ki, kj = pair_i[kept], pair_j[kept]
+    n_tokens_arr = feat_df['n_tokens'].to_numpy(dtype=np.int64)
+    pnl_arr = w_info['pnl_30d'].reindex(feat_df.index, fill_value=0).to_numpy(dtype=np.float64)
+    wr30_arr = w_info['win_rate_30d'].reindex(feat_df.index, fill_value=0).to_numpy(dtype=np.float64)
+
+    # 共同币种符号（最多显示10个）
+    tok_syms = np.array([token_sym_map.get(t, t[:8]) for t in tok_uniques], dtype=object)
+    common_labels = []
+    for a, b in zip(ki, kj):
+        common = np.flatnonzero(member[a] & member[b])
+        label = ', '.join(tok_syms[common[:10]])
+        if len(common) > 10:
+            label += f', ...等{len(common)}个'
+        common_labels.append(label)
+
+    behavior_df = pd.DataFrame({
+        '钱包1地址': addr_arr[ki],
+        '钱包1名称': name_arr[ki],
+        '钱包2地址': addr_arr[kj],
+        '钱包2名称': name_arr[kj],
+        '综合相似度': np.round(score[kept], 3),
+        '币种重叠度(Jaccard)': np.round(jaccard[kept], 3),
+        '共同币种数': inter[kept],
+        '共同币种': common_labels,
+        '仓位相似度': np.round(cost_sim[kept], 3),
+        '钱包1胜率(%)': win_rate[ki],
+        '钱包2胜率(%)': win_rate[kj],
+        '胜率差(%)': np.round(wr_diff[kept], 1),
+        '钱包1总成本(USD)': np.round(total_cost[ki], 2),
+        '钱包2总成本(USD)': np.round(total_cost[kj], 2),
+        '钱包1交易币种数': n_tokens_arr[ki],
+        '钱包2交易币种数': n_tokens_arr[kj],
+        '钱包1_30D_PnL': np.round(pnl_arr[ki], 2),
+        '钱包2_30D_PnL': np.round(pnl_arr[kj], 2),
+        '钱包1_30D_胜率(%)': np.round(wr30_arr[ki], 2),
+        '钱包2_30D_胜率(%)': np.round(wr30_arr[kj], 2),
+    })
     if not behavior_df.empty:
         behavior_df = behavior_df.sort_values(
             '综合相似度', ascending=False
@@ -1354,7 +1483,8 @@ def save_to_excel(all_results, filename=None):
     print(f"保存报表: {filename}")
     print(f"{'=' * 60}")
 
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+    with pd.ExcelWriter(filename, engine=EXCEL_ENGINE,
+                        engine_kwargs=EXCEL_ENGINE_KWARGS) as writer:
         sheet_count = 0
 
         def write_sheet(df, name):
@@ -5,6 +5,8 @@
 """
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 
 def check_gmgn_api():
@@ -22,77 +24,85 @@ def check_gmgn_api():
     print("🔍 检查 GMGN API 返回的字段")
     print("=" * 80)
     
-    for tag_name, url in apis:
-        print(f"\n📡 请求: {tag_name}")
-        print(f"   URL: {url}")
-        
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code != 200:
-                print(f"   ❌ 请求失败: HTTP {response.status_code}")
-                continue
-            
-            data = response.json()
-            
-            if data.get('code') != 0:
-                print(f"   ❌ API返回错误: {data.get('msg')}")
-                continue
-            
-            # 获取第一个钱包的数据
-            wallets = data.get('data', {}).get('rank', [])
-            
-            if not wallets:
-                print(f"   ❌ 没有返回钱包数据")
-                continue
-            
-            first_wallet = wallets[0]
-            
-            print(f"   ✅ 成功获取 {len(wallets)} 个钱包")
-            print(f"\n   📋 第一个钱包的所有字段:")
-            print(f"   " + "-" * 76)
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
+    }
+    
+    # 各标签请求相互独立，先全部并发发出，再按原顺序逐个取结果输出；
+    # 请求异常在 future.result() 处重新抛出。
+    # 会话被多个线程共用：连接池按并发数设定大小，每个请求都能拿到独立连接
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=len(apis)) as executor:
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=len(apis)))
+        futures = [executor.submit(session.get, url, headers=headers, timeout=10)
+                   for _, url in apis]
+
+        for (tag_name, url), future in zip(apis, futures):
+            print(f"\n📡 请求: {tag_name}")
+            print(f"   URL: {url}")
             
-            # 打印所有字段
-            for key in sorted(first_wallet.keys()):
-                value = first_wallet[key]
+            try:
+                response = future.result()
                 
-                # 格式化显示
-                if isinstance(value, float):
-                    value_str = f"{value:.6f}"
-                elif isinstance(value, list):
-                    value_str = f"[...] ({len(value)} items)"
-                elif isinstance(value, dict):
-                    value_str = f"{{...}} ({len(value)} keys)"
-                else:
-                    value_str = str(value)[:50]
+                if response.status_code != 200:
+                    print(f"   ❌ 请求失败: HTTP {response.status_code}")
+                    continue
                 
-                print(f"   {key:30s} = {value_str}")
-            
-            # 重点检查的字段
-            print(f"\n   🎯 重点字段检查:")
-            important_fields = [
-                'win_rate_7d', 'winrate', 'winrate_7d', 'win_rate',
-                'avg_hold_time', 'avg_hold_time_7d', 'hold_time',
-                'buy_7d', 'sell_7d', 'buy', 'sell',
-                'pnl_7d', 'profit_7d', 'realized_profit_7d',
-                'tags'
-            ]
-            
-            for field in important_fields:
-                if field in first_wallet:
-                    value = first_wallet[field]
-                    print(f"   ✅ {field:30s} = {value}")
-                else:
-                    print(f"   ❌ {field:30s} = (不存在)")
-            
-        except requests.Timeout:
-            print(f"   ❌ 请求超时")
-        except Exception as e:
-            print(f"   ❌ 错误: {e}")
+                data = response.json()
+                
+                if data.get('code') != 0:
+                    print(f"   ❌ API返回错误: {data.get('msg')}")
+                    continue
+                
+                # 获取第一个钱包的数据
+                wallets = data.get('data', {}).get('rank', [])
+                
+                if not wallets:
+                    print(f"   ❌ 没有返回钱包数据")
+                    continue
+                
+                first_wallet = wallets[0]
+                
+                print(f"   ✅ 成功获取 {len(wallets)} 个钱包")
+                print(f"\n   📋 第一个钱包的所有字段:")
+                print(f"   " + "-" * 76)
+                
+                # 打印所有字段
+                for key in sorted(first_wallet.keys()):
+                    value = first_wallet[key]
+                    
+                    # 格式化显示
+                    if isinstance(value, float):
+                        value_str = f"{value:.6f}"
+                    elif isinstance(value, list):
+                        value_str = f"[...] ({len(value)} items)"
+                    elif isinstance(value, dict):
+                        value_str = f"{{...}} ({len(value)} keys)"
+                    else:
+                        value_str = str(value)[:50]
+                    
+                    print(f"   {key:30s} = {value_str}")
+                
+                # 重点检查的字段
+                print(f"\n   🎯 重点字段检查:")
+                important_fields = [
+                    'win_rate_7d', 'winrate', 'winrate_7d', 'win_rate',
+                    'avg_hold_time', 'avg_hold_time_7d', 'hold_time',
+                    'buy_7d', 'sell_7d', 'buy', 'sell',
+                    'pnl_7d', 'profit_7d', 'realized_profit_7d',
+                    'tags'
+                ]
+                
+                for field in important_fields:
+                    if field in first_wallet:
+                        value = first_wallet[field]
+                        print(f"   ✅ {field:30s} = {value}")
+                    else:
+                        print(f"   ❌ {field:30s} = (不存在)")
+                
+            except requests.Timeout:
+                print(f"   ❌ 请求超时")
+            except Exception as e:
+                print(f"   ❌ 错误: {e}")
     
     print("\n" + "=" * 80)
     print("💡 提示:")
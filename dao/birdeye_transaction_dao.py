@@ -4,7 +4,7 @@ BirdeyeWalletTransaction DAO 数据访问对象
 """
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from sqlalchemy import select, update, delete, func, and_, or_, desc
+from sqlalchemy import select, update, delete, func, and_, or_, desc, case
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 import json
@@ -358,36 +358,13 @@ class BirdeyeWalletTransactionDAO:
         try:
             cutoff_time = datetime.now() - timedelta(days=days)
             
-            # 总交易数
-            stmt_count = (
-                select(func.count())
-                .select_from(BirdeyeWalletTransaction)
-                .where(
-                    and_(
-                        BirdeyeWalletTransaction.from_address == wallet_address,
-                        BirdeyeWalletTransaction.block_time >= cutoff_time
-                    )
-                )
-            )
-            total_count = self.session.execute(stmt_count).scalar()
-            
-            # 成功交易数
-            stmt_success = (
-                select(func.count())
-                .select_from(BirdeyeWalletTransaction)
-                .where(
-                    and_(
-                        BirdeyeWalletTransaction.from_address == wallet_address,
-                        BirdeyeWalletTransaction.block_time >= cutoff_time,
-                        BirdeyeWalletTransaction.status == True
-                    )
+            # 总交易数、成功交易数、总手续费在同一次扫描中聚合，一次往返
+            stmt = (
+                select(
+                    func.count(),
+                    func.sum(case((BirdeyeWalletTransaction.status == True, 1), else_=0)),
+                    func.sum(BirdeyeWalletTransaction.fee)
                 )
-            )
-            success_count = self.session.execute(stmt_success).scalar()
-            
-            # 总手续费
-            stmt_fee = (
-                select(func.sum(BirdeyeWalletTransaction.fee))
                 .select_from(BirdeyeWalletTransaction)
                 .where(
                     and_(
@@ -396,7 +373,10 @@ class BirdeyeWalletTransactionDAO:
                     )
                 )
             )
-            total_fee = self.session.execute(stmt_fee).scalar() or 0
+            total_count, success_count, total_fee = self.session.execute(stmt).one()
+            # 无匹配行时 SUM 为 NULL；MySQL 的 SUM 返回 Decimal，转回 int 与 COUNT 一致
+            success_count = int(success_count or 0)
+            total_fee = total_fee or 0
             
             return {
                 'wallet_address': wallet_address,
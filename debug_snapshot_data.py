@@ -7,6 +7,10 @@ from sqlalchemy import and_
 from config.database import get_session
 from models.smart_wallet_snapshot import SmartWalletSnapshot
 
+# 数据完整性统计用到的列（顺序与 check_data_quality 中的解包一致）
+STAT_COLUMNS = ('pnl_7d', 'win_rate_7d', 'tx_count_7d', 'avg_hold_time_7d', 'name')
+TOOL_COLUMNS = ('uses_trojan', 'uses_bullx', 'uses_photon', 'uses_axiom', 'uses_bot')
+
 
 def check_data_quality():
     """检查数据质量"""
@@ -72,22 +76,27 @@ def check_data_quality():
     print("📊 数据完整性统计 (最新日期):")
     print("=" * 80)
     
-    latest_all = session.query(SmartWalletSnapshot).filter(
+    # 只查询统计用到的列，结果行（元组）一次转置为按列的值序列，
+    # 不再为每行实例化 ORM 对象、每项统计再逐行取属性
+    rows = session.query(
+        *(getattr(SmartWalletSnapshot, c) for c in STAT_COLUMNS + TOOL_COLUMNS)
+    ).filter(
         SmartWalletSnapshot.snapshot_date == latest_date
     ).all()
     
-    total = len(latest_all)
+    total = len(rows)
+    columns = list(zip(*rows)) or [()] * (len(STAT_COLUMNS) + len(TOOL_COLUMNS))
+    pnl_7d, win_rate_7d, tx_count_7d, avg_hold_time_7d, names = columns[:len(STAT_COLUMNS)]
+    tool_flags = zip(*columns[len(STAT_COLUMNS):])
     
     # 统计各字段的非零数量
     stats = {
-        'pnl_7d 非0': sum(1 for s in latest_all if s.pnl_7d != 0),
-        'win_rate_7d 非0': sum(1 for s in latest_all if s.win_rate_7d != 0),
-        'tx_count_7d 非0': sum(1 for s in latest_all if s.tx_count_7d != 0),
-        'avg_hold_time_7d 非0': sum(1 for s in latest_all if s.avg_hold_time_7d != 0),
-        '有名称': sum(1 for s in latest_all if s.name),
-        '使用工具': sum(1 for s in latest_all if any([
-            s.uses_trojan, s.uses_bullx, s.uses_photon, s.uses_axiom, s.uses_bot
-        ])),
+        'pnl_7d 非0': sum(1 for v in pnl_7d if v != 0),
+        'win_rate_7d 非0': sum(1 for v in win_rate_7d if v != 0),
+        'tx_count_7d 非0': sum(1 for v in tx_count_7d if v != 0),
+        'avg_hold_time_7d 非0': sum(1 for v in avg_hold_time_7d if v != 0),
+        '有名称': sum(1 for v in names if v),
+        '使用工具': sum(1 for flags in tool_flags if any(flags)),
     }
     
     print(f"\n总记录数: {total}")
@@ -100,23 +109,26 @@ def check_data_quality():
     print("📈 字段值范围:")
     print("=" * 80)
     
+    pnl_values = [v or 0 for v in pnl_7d]
     print(f"\n7D盈利:")
-    print(f"  最小值: ${min(s.pnl_7d or 0 for s in latest_all):,.2f}")
-    print(f"  最大值: ${max(s.pnl_7d or 0 for s in latest_all):,.2f}")
-    print(f"  平均值: ${sum(s.pnl_7d or 0 for s in latest_all) / total:,.2f}")
+    print(f"  最小值: ${min(pnl_values):,.2f}")
+    print(f"  最大值: ${max(pnl_values):,.2f}")
+    print(f"  平均值: ${sum(pnl_values) / total:,.2f}")
     
+    win_rates = [v or 0 for v in win_rate_7d]
     print(f"\n7D胜率:")
-    print(f"  最小值: {min(s.win_rate_7d or 0 for s in latest_all):.2f}%")
-    print(f"  最大值: {max(s.win_rate_7d or 0 for s in latest_all):.2f}%")
-    print(f"  平均值: {sum(s.win_rate_7d or 0 for s in latest_all) / total:.2f}%")
+    print(f"  最小值: {min(win_rates):.2f}%")
+    print(f"  最大值: {max(win_rates):.2f}%")
+    print(f"  平均值: {sum(win_rates) / total:.2f}%")
     
+    tx_counts = [v or 0 for v in tx_count_7d]
     print(f"\n7D交易次数:")
-    print(f"  最小值: {min(s.tx_count_7d or 0 for s in latest_all)}")
-    print(f"  最大值: {max(s.tx_count_7d or 0 for s in latest_all)}")
-    print(f"  平均值: {sum(s.tx_count_7d or 0 for s in latest_all) / total:.1f}")
+    print(f"  最小值: {min(tx_counts)}")
+    print(f"  最大值: {max(tx_counts)}")
+    print(f"  平均值: {sum(tx_counts) / total:.1f}")
     
     print(f"\n7D持仓时长:")
-    hold_times = [s.avg_hold_time_7d or 0 for s in latest_all]
+    hold_times = [v or 0 for v in avg_hold_time_7d]
     print(f"  最小值: {min(hold_times)} 秒 ({min(hold_times)/3600:.2f} 小时)")
     print(f"  最大值: {max(hold_times)} 秒 ({max(hold_times)/3600:.2f} 小时)")
     print(f"  平均值: {sum(hold_times) / total:.1f} 秒 ({sum(hold_times) / total / 3600:.2f} 小时)")
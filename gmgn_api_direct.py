@@ -7,6 +7,10 @@ import requests
 import json
 import time
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.json_utils import json_loads
 
 # ================= 配置区 =================
 # GMGN API 地址（你在浏览器中找到的）
@@ -42,9 +46,32 @@ HEADERS = {
 
 # 抓取间隔（秒）
 LOOP_INTERVAL = 60
+
+# 传输层重试次数（连接/读取失败、429/5xx 按指数退避重试）
+MAX_RETRIES = 3
 # =========================================
 
 
+def _build_session():
+    """
+    创建复用连接的 HTTP 会话
+    连接池保持 keep-alive，每轮抓取不再重新建立 TCP/TLS 连接；
+    重试由 urllib3 在传输层完成，最终响应仍交给下面的状态码处理
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    return session
+
+
+SESSION = _build_session()
+
+
 def fetch_smart_wallets():
     """
     直接调用 GMGN API 获取聪明钱数据
@@ -53,7 +80,7 @@ def fetch_smart_wallets():
         print(f"🌐 正在请求 API: {API_URL}")
         
         # 发送 GET 请求
-        response = requests.get(
+        response = SESSION.get(
             API_URL,
             params=API_PARAMS,
             headers=HEADERS,
@@ -77,7 +104,8 @@ def fetch_smart_wallets():
             return None
         
         if response.status_code == 200:
-            data = response.json()
+            # 直接解析原始字节，省去 response.json() 的文本解码
+            data = json_loads(response.content)
             
             if data.get("code") == 0 and "data" in data:
                 # 解析钱包数据
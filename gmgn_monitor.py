@@ -3,6 +3,8 @@ import json
 import time
 from playwright.async_api import async_playwright
 
+from utils.json_utils import json_loads
+
 # ================= 配置区 =================
 # GMGN 聪明钱页面的地址 (直接定位到 SOL 链的 Smart Degen)
 TARGET_URL = "https://gmgn.ai/?chain=sol&tab=smart_degen"
@@ -41,7 +43,7 @@ async def intercept_response(response):
             print(f"完整URL: {response.url}")
             
             # 2. 获取 JSON 数据
-            json_data = await response.json()
+            json_data = json_loads(await response.body())
             
             print(f"✅ [数据获取] 成功获取 JSON 响应")
             
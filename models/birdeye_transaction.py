@@ -11,6 +11,7 @@ from sqlalchemy import (
 from sqlalchemy.orm import Mapped, mapped_column
 
 from config.database import Base
+from utils.json_utils import json_loads
 
 
 class BirdeyeWalletTransaction(Base):
@@ -22,6 +23,10 @@ class BirdeyeWalletTransaction(Base):
         Index('idx_from', 'from'),  # 使用数据库中的实际列名
         Index('idx_block_time', 'block_time'),
         Index('idx_block_number', 'block_number'),
+        # 按钱包查询 buy/sell 并按时间排序（analyze_wallet_snapshot*.py），
+        # 可走索引范围扫描且无需 filesort。已有表需手动执行：
+        # CREATE INDEX idx_from_side_time ON birdeye_wallet_transactions (`from`, side, block_time);
+        Index('idx_from_side_time', 'from', 'side', 'block_time'),
         {'comment': 'Birdeye钱包历史交易记录表'}
     )
     
@@ -142,8 +147,6 @@ class BirdeyeWalletTransaction(Base):
     
     def to_dict(self) -> dict:
         """转换为字典"""
-        import json
-        
         return {
             'id': self.id,
             'tx_hash': self.tx_hash,
@@ -154,9 +157,9 @@ class BirdeyeWalletTransaction(Base):
             'to': self.to,
             'fee': self.fee,
             'main_action': self.main_action,
-            'balance_change': json.loads(self.balance_change) if self.balance_change else None,
-            'contract_label': json.loads(self.contract_label) if self.contract_label else None,
-            'token_transfers': json.loads(self.token_transfers) if self.token_transfers else None,
+            'balance_change': json_loads(self.balance_change) if self.balance_change else None,
+            'contract_label': json_loads(self.contract_label) if self.contract_label else None,
+            'token_transfers': json_loads(self.token_transfers) if self.token_transfers else None,
             'block_time_unix': self.block_time_unix,
             'side': self.side,
             'create_time': self.create_time.isoformat() if self.create_time else None,
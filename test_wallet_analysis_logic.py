@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+测试钱包分析中的向量化/JIT 计算逻辑（不需要数据库）
+
+- parse_balance_changes 与逐条解析的参考实现结果一致
+- _reduce_balance_items_loop 与 _reduce_balance_items_numpy 结果一致
+- _wallet_summary_loop 与 _wallet_summary_numpy 结果一致
+- _pair_token_overlap 稀疏 / 稠密两条路径与逐对按位比较结果一致
+
+可以直接运行: python test_wallet_analysis_logic.py
+"""
+import json
+import random
+
+import numpy as np
+
+from utils.balance_change_utils import (
+    SOL_TOKENS, STABLECOINS,
+    parse_balance_changes, _reduce_balance_items_loop, _reduce_balance_items_numpy,
+)
+from analyze_wallet_snapshot_source import (
+    _wallet_summary_loop, _wallet_summary_numpy,
+    _pair_token_overlap, _pair_overlap_sparse, _pair_overlap_loop, _pair_overlap_kernel,
+)
+
+
+def parse_balance_change_reference(bc_str):
+    """
+    逐条解析单笔交易的 balance_change（参考实现，仅用于校验 parse_balance_changes）
+    无效记录或没有非 Quote 代币时返回 None
+    """
+    if not bc_str:
+        return None
+    try:
+        bc = json.loads(bc_str)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(bc, list) or len(bc) < 2:
+        return None
+
+    sol_total = 0.0
+    stable_total = 0.0
+    token_info = None
+    other_tokens = []
+
+    for item in bc:
+        symbol = item.get('symbol', '')
+        name = item.get('name', '')
+        raw_amount = item.get('amount', 0)
+        decimals = item.get('decimals', 0)
+        address = item.get('address', '')
+
+        amount = raw_amount / (10 ** decimals) if decimals and decimals > 0 else raw_amount
+
+        if symbol in SOL_TOKENS or name in SOL_TOKENS:
+            sol_total += amount
+        elif symbol in STABLECOINS or name in STABLECOINS:
+            stable_total += amount
+        else:
+            other_tokens.append(amount)
+            # 目标代币：绝对值最大者，并列取先出现
+            if token_info is None or abs(amount) > abs(token_info['amount']):
+                token_info = {
+                    'symbol': symbol or name or 'UNKNOWN',
+                    'address': address,
+                    'amount': amount,
+                }
+
+    if token_info is None:
+        return None
+
+    # 除目标代币外还有非零的其他非 Quote 代币
+    has_other = sum(1 for a in other_tokens if a != 0) - (token_info['amount'] != 0) > 0
+    return {
+        'sol_total': sol_total,
+        'stable_total': stable_total,
+        'is_token_swap': abs(sol_total) < 0.01 and abs(stable_total) < 0.01 and has_other,
+        'token_symbol': token_info['symbol'],
+        'token_address': token_info['address'],
+        'token_amount': token_info['amount'],
+    }
+
+
+def _random_balance_change(rng):
+    """随机生成一条 balance_change（含无效 JSON、缺字段、并列金额等边界情况）"""
+    r = rng.random()
+    if r < 0.05:
+        return rng.choice([None, '', '{bad json', '{}', '[]', '[{"symbol": "SOL", "amount": 1}]'])
+
+    symbols = ['SOL', 'WSOL', 'Wrapped SOL', 'USDC', 'USDT', 'USD Coin', 'BONK', 'WIF', 'POPCAT', '']
+    items = []
+    for _ in range(rng.randint(2, 5)):
+        item = {'amount': rng.choice([0, 5, -5, 1000, -1000, rng.randint(-10 ** 12, 10 ** 12)])}
+        symbol = rng.choice(symbols)
+        if symbol or rng.random() < 0.5:
+            item['symbol'] = symbol
+        if rng.random() < 0.7:
+            # name 也可能命中 Quote Token（symbol 为空时）
+            item['name'] = rng.choice(['Solana', 'USD Coin', 'Wrapped SOL', 'Bonk', ''])
+        if rng.random() < 0.9:
+            item['decimals'] = rng.choice([None, 0, 6, 9])
+        item['address'] = f'mint{rng.randint(0, 20)}'
+        items.append(item)
+    return json.dumps(items)
+
+
+def test_parse_balance_changes():
+    """parse_balance_changes 与逐条解析参考实现一致"""
+    rng = random.Random(42)
+    rows = [(f'w{i}', i, rng.choice(['buy', 'sell']), _random_balance_change(rng))
+            for i in range(3000)]
+
+    df = parse_balance_changes(rows)
+    expected = {}
+    for row in rows:
+        parsed = parse_balance_change_reference(row[3])
+        if parsed is not None:
+            expected[row[0]] = parsed
+
+    assert list(df['address']) == [a for a in (r[0] for r in rows) if a in expected], '有效交易或顺序不一致'
+    for rec in df.to_dict('records'):
+        ref = expected[rec['address']]
+        for col in ['sol_total', 'stable_total', 'token_amount']:
+            assert np.isclose(rec[col], ref[col], rtol=1e-12, atol=0), (rec['address'], col)
+        for col in ['is_token_swap', 'token_symbol', 'token_address']:
+            assert rec[col] == ref[col], (rec['address'], col, rec[col], ref[col])
+
+    assert parse_balance_changes([]).empty
+    print(f"  ✅ parse_balance_changes: {len(df)}/{len(rows)} 条有效交易与参考实现一致")
+
+
+def test_reduce_balance_items():
+    """_reduce_balance_items_loop 与 _reduce_balance_items_numpy 一致"""
+    rng = np.random.default_rng(0)
+    n = 500
+    lengths = rng.integers(0, 6, size=n)  # 部分交易没有条目
+    row_id = np.repeat(np.arange(n), lengths)
+    # 小整数金额制造并列最大值和零金额
+    amount = rng.choice([0.0, 1.0, -1.0, 2.5, -2.5, 7.0], size=len(row_id))
+    kind = rng.integers(0, 3, size=len(row_id)).astype(np.int8)
+
+    loop = _reduce_balance_items_loop(row_id, amount, kind, n)
+    vect = _reduce_balance_items_numpy(row_id, amount, kind, n)
+    for name, a, b in zip(['sol_total', 'stable_total', 'target_idx', 'nonzero_other'], loop, vect):
+        assert np.allclose(a, b), name
+    print(f"  ✅ _reduce_balance_items: {len(row_id)} 个条目，两种实现一致")
+
+
+def test_wallet_summary():
+    """_wallet_summary_loop 与 _wallet_summary_numpy 一致"""
+    rng = np.random.default_rng(1)
+    n = 80  # 部分钱包没有记录（最佳/最差收益率为 ∓inf）
+    codes = rng.integers(0, n - 5, size=2000)
+    cost = rng.uniform(0, 1000, size=len(codes))
+    rev = rng.uniform(0, 1000, size=len(codes))
+    ret = rng.choice([-100.0, -3.5, 0.0, 12.0, 250.0], size=len(codes))
+
+    loop = _wallet_summary_loop(codes, cost, rev, ret, n)
+    vect = _wallet_summary_numpy(codes, cost, rev, ret, n)
+    names = ['sum_cost', 'sum_rev', 'n_tokens', 'n_profit', 'n_loss', 'max_ret', 'min_ret']
+    for name, a, b in zip(names, loop, vect):
+        assert np.allclose(a, b), name
+    print(f"  ✅ _wallet_summary: {len(codes)} 条明细，两种实现一致")
+
+
+def _expected_overlap(member):
+    """逐对按位比较得到的交集/并集大小"""
+    i, j = np.triu_indices(member.shape[0], k=1)
+    return (member[i] & member[j]).sum(axis=1), (member[i] | member[j]).sum(axis=1)
+
+
+def test_pair_token_overlap():
+    """_pair_token_overlap 稀疏 / 稠密路径与逐对按位比较一致"""
+    rng = np.random.default_rng(2)
+    dense_path = 'Numba 稠密' if _pair_overlap_kernel is not None else '倒排稀疏'
+    cases = {
+        # 名称: (钱包×币种矩阵, 应走的路径)
+        '稀疏': (rng.random((60, 500)) < 0.01, '倒排稀疏'),
+        '稠密': (rng.random((60, 100)) < 0.7, dense_path),  # 币种数不是 64 的倍数，覆盖补齐
+        '单个钱包': (rng.random((1, 10)) < 0.5, '倒排稀疏'),
+    }
+    for label, (member, expected_path) in cases.items():
+        # 与 _pair_token_overlap 中的路径选择条件一致
+        owners = member.sum(axis=0).astype(np.int64)
+        sparse_work = int((owners * (owners - 1) // 2).sum())
+        dense_work = member.shape[0] * (member.shape[0] - 1) // 2 * ((member.shape[1] + 63) // 64)
+        path = 'Numba 稠密' if _pair_overlap_kernel is not None and sparse_work > dense_work else '倒排稀疏'
+        assert path == expected_path, (label, path)
+
+        exp_inter, exp_union = _expected_overlap(member)
+        _, _, inter, union = _pair_token_overlap(member)
+        assert np.array_equal(inter, exp_inter) and np.array_equal(union, exp_union), label
+        # 稀疏实现在任何输入上都应正确
+        assert np.array_equal(_pair_overlap_sparse(member), exp_inter), label
+        print(f"  ✅ _pair_token_overlap[{label}]（{path}路径）: {len(inter)} 个钱包对一致")
+
+    # 未编译的逐对内核（未安装 Numba 时的逻辑参考）
+    member = cases['稠密'][0][:20]
+    packed = np.packbits(member, axis=1, bitorder='little')
+    packed = np.pad(packed, ((0, 0), (0, (-packed.shape[1]) % 8)))
+    with np.errstate(over='ignore'):  # 未编译时 SWAR popcount 的乘法按 uint64 回绕属预期
+        inter, union = _pair_overlap_loop(np.ascontiguousarray(packed).view(np.uint64))
+    exp_inter, exp_union = _expected_overlap(member)
+    assert np.array_equal(inter, exp_inter) and np.array_equal(union, exp_union)
+    print("  ✅ _pair_overlap_loop: 未编译内核与逐对按位比较一致")
+
+
+def main():
+    print("=" * 70)
+    print("🧪 钱包分析计算逻辑测试")
+    print("=" * 70)
+    test_parse_balance_changes()
+    test_reduce_balance_items()
+    test_wallet_summary()
+    test_pair_token_overlap()
+    print("=" * 70)
+    print("测试完成！")
+
+
+if __name__ == '__main__':
+    main()
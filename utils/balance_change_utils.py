@@ -0,0 +1,383 @@
+"""
+balance_change 解析与钱包交易查询工具
+
+analyze_wallet_snapshot.py 与 analyze_wallet_snapshot_source.py 共用：
+  - parse_balance_changes: 批量解析 birdeye_wallet_transactions.balance_change
+  - query_wallet_trades:   查询指定钱包的 buy/sell 交易（优先在 MySQL 端解析）
+
+交易只返回 SOL / 稳定币的变化量（sol_total / stable_total），
+折算为 USD 还是 SOL 等值由调用方决定。
+"""
+import json
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from utils.json_utils import json_loads
+
+try:
+    from numba import njit  # 可选：JIT 编译 balance_change 汇总循环
+except ImportError:
+    njit = None
+
+# Quote Tokens（用于判断成本/收入币种）
+SOL_TOKENS = frozenset({'SOL', 'Wrapped SOL', 'WSOL'})
+STABLECOINS = frozenset({'USDC', 'USDT', 'USD Coin'})
+QUOTE_TOKENS = SOL_TOKENS | STABLECOINS
+
+# 交易查询使用服务端游标流式读取，每次取回的行数
+STREAM_CHUNK_SIZE = 10000
+
+# parse_balance_changes / query_wallet_trades 返回的列
+TRADE_COLUMNS = ['address', 'block_time', 'side', 'sol_total', 'stable_total',
+                 'is_token_swap', 'token_symbol', 'token_address', 'token_amount']
+
+
+# balance_change 条目类别编码
+_KIND_SOL, _KIND_STABLE, _KIND_OTHER = 0, 1, 2
+
+
+def _reduce_balance_items_loop(row_id, amount, kind, n):
+    """
+    单次扫描所有 balance_change 条目，按交易汇总（供 Numba 编译）
+
+    返回:
+      - sol_total / stable_total: 每笔交易的 SOL / 稳定币变化量
+      - target_idx:    每笔交易目标代币（非 Quote 中绝对值最大、并列取先出现）的条目下标，无则为 -1
+      - nonzero_other: 每笔交易中金额非零的非 Quote 代币条目数
+    """
+    sol_total = np.zeros(n)
+    stable_total = np.zeros(n)
+    target_idx = np.full(n, -1, dtype=np.int64)
+    nonzero_other = np.zeros(n, dtype=np.int64)
+
+    for i in range(row_id.shape[0]):
+        r = row_id[i]
+        a = amount[i]
+        if kind[i] == _KIND_SOL:
+            sol_total[r] += a
+        elif kind[i] == _KIND_STABLE:
+            stable_total[r] += a
+        else:
+            if abs(a) > 0:
+                nonzero_other[r] += 1
+            t = target_idx[r]
+            if t < 0 or abs(a) > abs(amount[t]):
+                target_idx[r] = i
+
+    return sol_total, stable_total, target_idx, nonzero_other
+
+
+def _reduce_balance_items_numpy(row_id, amount, kind, n):
+    """_reduce_balance_items_loop 的纯 NumPy 实现（未安装 Numba 时使用）"""
+    is_sol = kind == _KIND_SOL
+    is_stable = kind == _KIND_STABLE
+    is_other = kind == _KIND_OTHER
+    abs_amount = np.abs(amount)
+
+    sol_total = np.bincount(row_id[is_sol], weights=amount[is_sol], minlength=n)
+    stable_total = np.bincount(row_id[is_stable], weights=amount[is_stable], minlength=n)
+    nonzero_other = np.bincount(row_id[is_other & (abs_amount > 0)], minlength=n)
+
+    # 按绝对值降序稳定排序后，每笔交易第一条即目标代币
+    other_idx = np.flatnonzero(is_other)
+    other_idx = other_idx[np.argsort(-abs_amount[other_idx], kind='stable')]
+    rows_with_other, first = np.unique(row_id[other_idx], return_index=True)
+    target_idx = np.full(n, -1, dtype=np.int64)
+    target_idx[rows_with_other] = other_idx[first]
+
+    return sol_total, stable_total, target_idx, nonzero_other
+
+
+if njit is not None:
+    _reduce_balance_items = njit(cache=True)(_reduce_balance_items_loop)
+else:
+    _reduce_balance_items = _reduce_balance_items_numpy
+
+
+def parse_balance_changes(rows):
+    """
+    批量解析 balance_change
+
+    先逐行解码 JSON，再把所有 balance_change 条目展开成列式数组，
+    一次性完成金额换算、SOL/稳定币分类、按交易汇总及目标代币选取，
+    避免逐条目的 Python 循环。
+
+    判定规则:
+      - 金额按 decimals 换算为人类可读单位；symbol 或 name 属于 SOL_TOKENS / STABLECOINS
+        的条目计入 SOL / 稳定币变化，其余为非 Quote 代币
+      - 目标代币：非 Quote 代币中数量绝对值最大者（并列取先出现），没有则丢弃该交易
+      - 代币互换：SOL 变化 < 0.01（仅 gas）且无稳定币参与，但除目标代币外
+        还有数量非零的其他非 Quote 代币
+
+    参数:
+      - rows: 查询结果行 (from, block_time, side, balance_change)
+
+    返回 DataFrame（每行一笔有效交易，列见 TRADE_COLUMNS）
+    """
+
+    # ---- 1. JSON 解码，丢弃无效记录 ----
+    # 逐行循环内用到的函数先绑定为局部变量，省去每行的全局/属性查找
+    loads = json_loads
+    valid_rows = []
+    bcs = []
+    keep_row = valid_rows.append
+    keep_bc = bcs.append
+    for row in rows:
+        bc_str = row[3]
+        if not bc_str:
+            continue
+        try:
+            bc = loads(bc_str)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if not isinstance(bc, list) or len(bc) < 2:
+            continue
+        keep_row(row)
+        keep_bc(bc)
+
+    if not bcs:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+
+    # ---- 2. 展开为长表：每个 balance_change 条目一行，row_id 指向所属交易 ----
+    n = len(bcs)
+    lengths = np.fromiter((len(bc) for bc in bcs), dtype=np.int64, count=n)
+    row_id = np.repeat(np.arange(n), lengths)
+    items = pd.DataFrame.from_records(
+        [item for bc in bcs for item in bc],
+        columns=['symbol', 'name', 'amount', 'decimals', 'address'],
+    )
+    symbol = items['symbol'].fillna('').to_numpy(dtype=object)
+    name = items['name'].fillna('').to_numpy(dtype=object)
+    raw_amount = items['amount'].fillna(0).to_numpy(dtype=np.float64)
+    decimals = items['decimals'].fillna(0).to_numpy(dtype=np.float64)
+
+    # 转换为人类可读金额
+    scale = np.where(decimals > 0, np.power(10.0, decimals), 1.0)
+    amount = raw_amount / scale
+
+    # ---- 3. 分类：SOL / 稳定币 / 其他代币 ----
+    is_sol = (items['symbol'].isin(SOL_TOKENS) | items['name'].isin(SOL_TOKENS)).to_numpy()
+    is_stable = (items['symbol'].isin(STABLECOINS) | items['name'].isin(STABLECOINS)).to_numpy()
+    kind = np.where(is_sol, _KIND_SOL, np.where(is_stable, _KIND_STABLE, _KIND_OTHER))
+
+    # ---- 4. 按交易汇总 + 选取目标代币（非 Quote 代币中绝对值最大者）----
+    sol_total, stable_total, target_idx, nonzero_other = _reduce_balance_items(
+        row_id, amount, kind.astype(np.int8), n
+    )
+    target_row = np.flatnonzero(target_idx >= 0)
+    target_idx = target_idx[target_row]
+
+    # 除目标代币外，是否还有非零的其他代币参与
+    has_other = (nonzero_other[target_row] - (amount[target_idx] != 0)) > 0
+
+    # ---- 5. 组装结果（只保留找到目标代币的交易）----
+    sol_t = sol_total[target_row]
+    stable_t = stable_total[target_row]
+
+    # 检测代币互换：SOL 仅 gas、无稳定币参与，且有其他非目标代币参与
+    is_token_swap = (np.abs(sol_t) < 0.01) & (np.abs(stable_t) < 0.01) & has_other
+
+    t_symbol = symbol[target_idx]
+    t_name = name[target_idx]
+    token_symbol = np.where(
+        t_symbol != '', t_symbol, np.where(t_name != '', t_name, 'UNKNOWN')
+    )
+
+    src = [valid_rows[i] for i in target_row]
+    return pd.DataFrame({
+        'address': [r[0] for r in src],
+        'block_time': [r[1] for r in src],
+        'side': [r[2] for r in src],
+        'sol_total': sol_t,
+        'stable_total': stable_t,
+        'is_token_swap': is_token_swap,
+        'token_symbol': token_symbol,
+        'token_address': items['address'].to_numpy(dtype=object)[target_idx],
+        'token_amount': amount[target_idx],
+    }, columns=TRADE_COLUMNS)
+
+
+def _sql_str_list(values):
+    """将常量集合转为 SQL 字符串字面量列表，如 'SOL', 'WSOL'"""
+    return ', '.join(f"'{v}'" for v in sorted(values))
+
+
+# 在 MySQL 端用 JSON_TABLE 展开 balance_change（需要 MySQL 8.0+），
+# 每笔交易只返回一行：SOL/稳定币汇总 + 目标代币（非 Quote 中绝对值最大、并列取先出现）。
+# 判定规则与 parse_balance_changes 一致（字符串比较用 utf8mb4_bin 保持大小写敏感）；
+# 非法 JSON 按空数组处理，不会中断查询。
+_SERVER_PARSE_SQL = text(f"""
+    WITH items AS (
+        SELECT t.id, t.`from`, t.block_time, t.side,
+               j.idx, j.symbol, j.name, j.address,
+               CASE WHEN j.decimals > 0
+                    THEN COALESCE(j.amount, 0) / POW(10, j.decimals)
+                    ELSE COALESCE(j.amount, 0) END AS amount,
+               CASE WHEN j.symbol COLLATE utf8mb4_bin IN ({_sql_str_list(SOL_TOKENS)})
+                      OR j.name COLLATE utf8mb4_bin IN ({_sql_str_list(SOL_TOKENS)}) THEN 0
+                    WHEN j.symbol COLLATE utf8mb4_bin IN ({_sql_str_list(STABLECOINS)})
+                      OR j.name COLLATE utf8mb4_bin IN ({_sql_str_list(STABLECOINS)}) THEN 1
+                    ELSE 2 END AS kind
+        FROM birdeye_wallet_transactions t
+        JOIN _addrs a ON t.`from` = a.addr
+        CROSS JOIN JSON_TABLE(
+            IF(JSON_VALID(t.balance_change), t.balance_change, '[]'),
+            '$[*]' COLUMNS (
+                idx FOR ORDINALITY,
+                symbol VARCHAR(255) PATH '$.symbol',
+                name VARCHAR(255) PATH '$.name',
+                amount DOUBLE PATH '$.amount',
+                decimals INT PATH '$.decimals',
+                address VARCHAR(255) PATH '$.address'
+            )
+        ) AS j
+        WHERE t.side IN ('buy', 'sell')
+          AND IF(JSON_VALID(t.balance_change),
+                 JSON_TYPE(t.balance_change) = 'ARRAY'
+                 AND JSON_LENGTH(t.balance_change) >= 2,
+                 FALSE)
+    ),
+    ranked AS (
+        SELECT items.*,
+               SUM(CASE WHEN kind = 0 THEN amount ELSE 0 END) OVER w AS sol_total,
+               SUM(CASE WHEN kind = 1 THEN amount ELSE 0 END) OVER w AS stable_total,
+               SUM(CASE WHEN kind = 2 AND amount <> 0 THEN 1 ELSE 0 END) OVER w AS nonzero_other,
+               ROW_NUMBER() OVER (
+                   PARTITION BY id ORDER BY kind = 2 DESC, ABS(amount) DESC, idx
+               ) AS rn
+        FROM items
+        WINDOW w AS (PARTITION BY id)
+    )
+    SELECT `from`, block_time, side,
+           sol_total, stable_total, nonzero_other,
+           COALESCE(NULLIF(symbol, ''), NULLIF(name, ''), 'UNKNOWN') AS token_symbol,
+           address AS token_address,
+           amount AS token_amount
+    FROM ranked
+    WHERE rn = 1 AND kind = 2
+    ORDER BY block_time ASC
+""")
+
+_LOCAL_PARSE_SQL = text("""
+    SELECT t.`from`, t.block_time, t.side, t.balance_change
+    FROM birdeye_wallet_transactions t
+    JOIN _addrs a ON t.`from` = a.addr
+    WHERE t.side IN ('buy', 'sell')
+    ORDER BY t.block_time ASC
+""")
+
+
+# MySQL < 8.0 / 旧版 MariaDB 不支持 JSON_TABLE、窗口函数时的错误码：
+# 1064 语法错误（ER_PARSE_ERROR），1305 函数不存在（ER_SP_DOES_NOT_EXIST）
+_UNSUPPORTED_SQL_ERRORS = frozenset({1064, 1305})
+
+
+def _is_unsupported_sql_error(e):
+    """DBAPI 错误是否表示数据库不支持服务端解析所用的 SQL 特性"""
+    args = getattr(e.orig, 'args', ())
+    return bool(args) and args[0] in _UNSUPPORTED_SQL_ERRORS
+
+
+# 服务端游标（pymysql SSCursor）流式读取，避免 fetchall 一次性物化整批结果
+_STREAM_OPTIONS = {'stream_results': True, 'yield_per': STREAM_CHUNK_SIZE}
+
+
+def _load_address_table(session, addr_list):
+    """
+    将钱包地址写入会话级临时表 _addrs，查询改为 JOIN 该表
+
+    SQL 文本与地址数量无关，只需规划一次，也不再需要按批拼接 IN 子句。
+    临时表绑定在连接上，每条查询路径开始前重建，避免连接池复用时残留旧数据
+    """
+    session.execute(text("DROP TEMPORARY TABLE IF EXISTS _addrs"))
+    session.execute(text(
+        "CREATE TEMPORARY TABLE _addrs (addr VARCHAR(255) PRIMARY KEY)"
+    ))
+    session.execute(
+        text("INSERT IGNORE INTO _addrs (addr) VALUES (:addr)"),
+        [{'addr': addr} for addr in addr_list]
+    )
+
+
+def _query_trades_server_parsed(session, addr_list):
+    """在 MySQL 端解析 balance_change，本地只做代币互换判定"""
+    columns = ['address', 'block_time', 'side', 'sol_total', 'stable_total',
+               'nonzero_other', 'token_symbol', 'token_address', 'token_amount']
+    chunk_dfs = []
+    n_rows = 0
+
+    _load_address_table(session, addr_list)
+    result = session.execute(_SERVER_PARSE_SQL, execution_options=_STREAM_OPTIONS)
+
+    # 每块直接转为 DataFrame，不再累积整批行对象
+    for chunk in result.partitions():
+        n_rows += len(chunk)
+        chunk_dfs.append(pd.DataFrame(chunk, columns=columns))
+        print(f"    进度: 已获取 {n_rows} 条交易")
+
+    if chunk_dfs:
+        df = pd.concat(chunk_dfs, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=columns)
+    for col in ['sol_total', 'stable_total', 'token_amount']:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+    df['nonzero_other'] = pd.to_numeric(df['nonzero_other']).fillna(0).astype(int)
+
+    # 检测代币互换：SOL 仅 gas、无稳定币参与，且除目标代币外还有非零的其他代币
+    has_other = (df['nonzero_other'] - (df['token_amount'] != 0)) > 0
+    df['is_token_swap'] = (
+        (df['sol_total'].abs() < 0.01) & (df['stable_total'].abs() < 0.01) & has_other
+    )
+
+    return df[TRADE_COLUMNS]
+
+
+def _query_trades_local_parsed(session, addr_list):
+    """拉取原始 balance_change JSON，按块流式读取并在本地向量化解析"""
+    trade_dfs = []
+    n_trades = 0
+
+    _load_address_table(session, addr_list)
+    result = session.execute(_LOCAL_PARSE_SQL, execution_options=_STREAM_OPTIONS)
+
+    # 每块解析完即释放原始 JSON，峰值内存只与块大小相关
+    for chunk in result.partitions():
+        chunk_df = parse_balance_changes(chunk)
+        if not chunk_df.empty:
+            trade_dfs.append(chunk_df)
+            n_trades += len(chunk_df)
+        print(f"    进度: 已获取 {n_trades} 条交易")
+
+    if not trade_dfs:
+        return parse_balance_changes([])
+    return pd.concat(trade_dfs, ignore_index=True)
+
+
+def query_wallet_trades(session, addr_list):
+    """
+    查询指定钱包在 birdeye_wallet_transactions 中的 buy/sell 交易并解析 balance_change
+
+    优先在 MySQL 端用 JSON_TABLE 解析（只传回每笔交易的汇总行），
+    数据库不支持时（MySQL < 8.0）回退为拉取原始 JSON 在本地解析。
+    会话由调用方创建和关闭。
+
+    返回 DataFrame（列见 TRADE_COLUMNS）
+    """
+    if not addr_list:
+        # 无钱包时直接返回空表：executemany 写入空的地址列表会报缺少绑定参数
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+
+    try:
+        return _query_trades_server_parsed(session, addr_list)
+    except (ProgrammingError, OperationalError) as e:
+        # 只有数据库不支持 JSON_TABLE / 窗口函数时才回退；
+        # 连接中断、锁等待超时等其他错误照常抛出
+        if not _is_unsupported_sql_error(e):
+            raise
+        session.rollback()
+        print(f"  数据库不支持服务端解析 balance_change: {e.orig}")
+        print("  回退为本地解析...")
+        return _query_trades_local_parsed(session, addr_list)
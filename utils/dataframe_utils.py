@@ -0,0 +1,32 @@
+"""
+DataFrame 通用工具
+"""
+import numpy as np
+
+
+def top_n_rows(df, col, n=10):
+    """
+    按 col 降序取前 n 行
+
+    结果与 df.sort_values(col, ascending=False, kind='stable').head(n) 一致：
+    值相同的行按原顺序排列，NaN 排在最后。
+    用 np.partition 以 O(N) 找出第 n 大的值作为分界，只对选中的 n 行排序，不再整表排序。
+    """
+    neg = -df[col].to_numpy(dtype=float)
+    if len(neg) > n > 0:
+        kth = np.partition(neg, n - 1)[n - 1]
+        # 严格优于分界值的行（不足 n 行）与等于分界值的行；分界值为 NaN 时非 NaN 的行都在前
+        if np.isnan(kth):
+            at_kth = np.isnan(neg)
+            above = ~at_kth
+        else:
+            above = neg < kth
+            at_kth = neg == kth
+        # 与分界值相同的行按原顺序补足 n 行
+        fill = np.flatnonzero(at_kth)[:n - int(above.sum())]
+        idx = np.sort(np.concatenate([np.flatnonzero(above), fill]))
+    else:
+        idx = np.arange(min(len(neg), max(n, 0)))
+    # idx 已按原顺序排列，稳定排序保证并列值维持原顺序
+    idx = idx[np.argsort(neg[idx], kind='stable')]
+    return df.iloc[idx]
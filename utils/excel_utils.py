@@ -0,0 +1,15 @@
+"""
+Excel 报表写出工具
+
+EXCEL_ENGINE / EXCEL_ENGINE_KWARGS: 传给 pd.ExcelWriter 的 engine 与 engine_kwargs。
+安装了 xlsxwriter 时用它写（比 openpyxl 快），否则回退到 openpyxl。
+"""
+
+try:
+    import xlsxwriter  # noqa: F401  可选依赖
+    EXCEL_ENGINE = 'xlsxwriter'
+    # 不能开 constant_memory：该模式只保留当前行，而 pandas 按列写单元格，会丢数据
+    EXCEL_ENGINE_KWARGS = {'options': {'strings_to_urls': False}}
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+    EXCEL_ENGINE_KWARGS = None
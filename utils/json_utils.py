@@ -0,0 +1,13 @@
+"""
+JSON 解析工具
+
+json_loads: 安装了 orjson 时使用其 C 实现，否则回退到标准库 json.loads。
+两者都接受 str / bytes，解析失败时抛出的异常都是 json.JSONDecodeError 的子类。
+"""
+import json
+
+try:
+    import orjson  # 可选依赖
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
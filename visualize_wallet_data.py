@@ -3,11 +3,16 @@
 智能钱包数据可视化分析（带图表）
 需要安装: pip install matplotlib seaborn
 """
+import os
+import time
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, date
+from pathlib import Path
 from config.database import get_session
 from models.smart_wallet_snapshot import SmartWalletSnapshot
-from sqlalchemy import and_
+from sqlalchemy import and_, select
 
 try:
     import matplotlib.pyplot as plt
@@ -21,73 +26,180 @@ except ImportError:
     print("⚠️  matplotlib 未安装，将跳过图表生成")
     print("   安装命令: pip install matplotlib seaborn")
 
+try:
+    import pyarrow  # noqa: F401  可选：历史快照按天缓存为 Parquet
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+# 主要标签 / 使用工具：按优先级排列，取第一个命中的
+TAG_PRIORITY = {
+    'is_smart_money': '聪明钱',
+    'is_kol': 'KOL',
+    'is_hot_followed': '热门追踪',
+    'is_hot_remarked': '热门备注',
+}
+TOOL_PRIORITY = {
+    'uses_trojan': 'Trojan',
+    'uses_bullx': 'BullX',
+    'uses_photon': 'Photon',
+    'uses_axiom': 'Axiom',
+    'uses_bot': 'Bot',
+}
+
+SNAPSHOT_COLUMNS = [
+    SmartWalletSnapshot.address,
+    SmartWalletSnapshot.snapshot_date,
+    *(getattr(SmartWalletSnapshot, col) for col in TAG_PRIORITY),
+    *(getattr(SmartWalletSnapshot, col) for col in TOOL_PRIORITY),
+    SmartWalletSnapshot.pnl_1d,
+    SmartWalletSnapshot.pnl_7d,
+    SmartWalletSnapshot.pnl_30d,
+    SmartWalletSnapshot.win_rate_7d,
+    SmartWalletSnapshot.tx_count_7d,
+    SmartWalletSnapshot.avg_hold_time_7d,
+]
+
+# 快照查询使用服务端游标流式读取，每次取回的行数
+STREAM_CHUNK_SIZE = 10000
+_STREAM_OPTIONS = {'stream_results': True, 'yield_per': STREAM_CHUNK_SIZE}
+
+# 并行绘图的进程数（对应 4 张图表）
+PLOT_WORKERS = 4
+
+# 历史快照按天缓存为 Parquet（默认关闭，设置环境变量 SNAPSHOT_CACHE=1 开启；当天数据始终从数据库查询）
+SNAPSHOT_CACHE_ENABLED = HAS_PARQUET and os.getenv('SNAPSHOT_CACHE') == '1'
+SNAPSHOT_CACHE_DIR = Path(os.getenv('SNAPSHOT_CACHE_DIR', Path.home() / '.cache' / 'wallet_snapshots'))
+# 缓存文件超过该时长即重新查询，补录或修正的历史快照最迟一个周期后生效
+SNAPSHOT_CACHE_TTL_HOURS = float(os.getenv('SNAPSHOT_CACHE_TTL_HOURS', 24))
+
 
 def get_snapshot_data(days=7):
-    """获取快照数据"""
-    session = get_session()
-    
+    """获取快照数据（开启缓存时历史日期优先读取本地 Parquet，只查询缺失或过期的日期）"""
     end_date = date.today()
     start_date = end_date - timedelta(days=days-1)
     
     print(f"📅 查询日期范围: {start_date} 到 {end_date}")
     
-    snapshots = session.query(SmartWalletSnapshot).filter(
+    frames = []
+    missing_dates = []
+    for i in range(days):
+        day = start_date + timedelta(days=i)
+        cached = load_snapshot_cache(day) if SNAPSHOT_CACHE_ENABLED and day < end_date else None
+        if cached is not None:
+            frames.append(cached)
+        else:
+            missing_dates.append(day)
+    
+    if frames:
+        print(f"📦 从缓存读取 {len(frames)} 天数据")
+    
+    if missing_dates:
+        fetched = query_snapshot_data(missing_dates[0], missing_dates[-1])
+        if not fetched.empty:
+            fetched = fetched[fetched['date'].isin(missing_dates)]
+            if SNAPSHOT_CACHE_ENABLED:
+                save_snapshot_cache(fetched, end_date)
+            frames.append(fetched)
+    
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    
+    df = pd.concat(frames, ignore_index=True)
+    # 地址 / 标签 / 工具在多天之间大量重复，转为分类类型：每个取值只存一次，行上只存整数编码
+    df = df.astype({'address': 'category', 'tag': 'category', 'tool': 'category'})
+    print(f"✅ 获取 {len(df)} 条记录，{len(df['address'].unique())} 个钱包")
+    return df
+
+
+def load_snapshot_cache(day):
+    """读取某天的缓存；不存在、已过期或文件损坏时返回 None（按缺失日期重新查询）"""
+    cache_file = SNAPSHOT_CACHE_DIR / f'{day}.parquet'
+    try:
+        if time.time() - cache_file.stat().st_mtime > SNAPSHOT_CACHE_TTL_HOURS * 3600:
+            return None
+        return pd.read_parquet(cache_file, engine='pyarrow')
+    except (OSError, ValueError):  # 文件不存在 / pyarrow.ArrowInvalid（ValueError 子类）
+        return None
+
+
+def save_snapshot_cache(df, today):
+    """
+    把已结束日期的快照按天写入 Parquet 缓存（当天数据仍在更新，不缓存）
+    先写临时文件再 os.replace 原子替换，中断或并发运行不会留下半截文件
+    """
+    SNAPSHOT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for day, day_df in df.groupby('date'):
+        if day >= today:
+            continue
+        cache_file = SNAPSHOT_CACHE_DIR / f'{day}.parquet'
+        tmp_file = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+        try:
+            day_df.to_parquet(tmp_file, engine='pyarrow', index=False)
+            os.replace(tmp_file, cache_file)
+        finally:
+            tmp_file.unlink(missing_ok=True)
+
+
+def query_snapshot_data(start_date, end_date):
+    """从数据库查询日期范围内的快照数据"""
+    session = get_session()
+    
+    # 只 select 需要的列，结果行直接交给 DataFrame，避免逐行实例化 ORM 对象再拼 dict
+    stmt = select(*SNAPSHOT_COLUMNS).where(
         and_(
             SmartWalletSnapshot.snapshot_date >= start_date,
             SmartWalletSnapshot.snapshot_date <= end_date
         )
-    ).all()
+    )
     
-    session.close()
+    try:
+        # 服务端游标流式读取，每块直接转为 DataFrame，不再一次性物化全部行
+        result = session.execute(stmt, execution_options=_STREAM_OPTIONS)
+        cols = list(result.keys())
+        chunk_dfs = [pd.DataFrame(chunk, columns=cols) for chunk in result.partitions()]
+    finally:
+        session.close()
     
-    if not snapshots:
+    if not chunk_dfs:
         return pd.DataFrame()
     
-    # 转换为DataFrame
-    data = []
-    for snap in snapshots:
-        # 确定主要标签
-        main_tag = '其他'
-        if snap.is_smart_money:
-            main_tag = '聪明钱'
-        elif snap.is_kol:
-            main_tag = 'KOL'
-        elif snap.is_hot_followed:
-            main_tag = '热门追踪'
-        elif snap.is_hot_remarked:
-            main_tag = '热门备注'
-        
-        # 确定使用的工具
-        tool = '无'
-        if snap.uses_trojan:
-            tool = 'Trojan'
-        elif snap.uses_bullx:
-            tool = 'BullX'
-        elif snap.uses_photon:
-            tool = 'Photon'
-        elif snap.uses_axiom:
-            tool = 'Axiom'
-        elif snap.uses_bot:
-            tool = 'Bot'
-        
-        data.append({
-            'address': snap.address,
-            'date': snap.snapshot_date,
-            'tag': main_tag,
-            'tool': tool,
-            'pnl_1d': float(snap.pnl_1d or 0),
-            'pnl_7d': float(snap.pnl_7d or 0),
-            'pnl_30d': float(snap.pnl_30d or 0),
-            'win_rate_7d': float(snap.win_rate_7d or 0),
-            'tx_count_7d': snap.tx_count_7d or 0,
-            'avg_hold_time_7d': (snap.avg_hold_time_7d or 0) / 3600,  # 转换为小时
-        })
-    
-    df = pd.DataFrame(data)
-    print(f"✅ 获取 {len(df)} 条记录，{len(df['address'].unique())} 个钱包")
+    df = pd.concat(chunk_dfs, ignore_index=True)
+    
+    # 标签/工具按优先级取第一个命中的（NULL 视为 0）
+    df['tag'] = np.select(
+        [df[col].fillna(0).to_numpy() != 0 for col in TAG_PRIORITY],
+        list(TAG_PRIORITY.values()),
+        default='其他'
+    )
+    df['tool'] = np.select(
+        [df[col].fillna(0).to_numpy() != 0 for col in TOOL_PRIORITY],
+        list(TOOL_PRIORITY.values()),
+        default='无'
+    )
+    
+    # 只用于绘图，float32 / int32 精度足够，内存与归约带宽减半
+    float_cols = ['pnl_1d', 'pnl_7d', 'pnl_30d', 'win_rate_7d']
+    df[float_cols] = df[float_cols].apply(pd.to_numeric).fillna(0).astype('float32')
+    df['tx_count_7d'] = df['tx_count_7d'].fillna(0).astype('int32')
+    df['avg_hold_time_7d'] = (df['avg_hold_time_7d'].fillna(0) / 3600).astype('float32')  # 转换为小时
+    
+    df = df.rename(columns={'snapshot_date': 'date'})[
+        ['address', 'date', 'tag', 'tool', 'pnl_1d', 'pnl_7d', 'pnl_30d',
+         'win_rate_7d', 'tx_count_7d', 'avg_hold_time_7d']
+    ]
     return df
 
 
+def get_latest_data(df, latest_df=None):
+    """返回 (最新日期, 最新日期的数据)；已提供 latest_df 时直接复用，不再重新筛选"""
+    if latest_df is None:
+        latest_df = df[df['date'] == df['date'].max()]
+    return latest_df['date'].iloc[0], latest_df
+
+
 def plot_daily_trend(df, output_file='analysis_daily_trend.png'):
     """绘制每日趋势图"""
     if not HAS_PLOT or df.empty:
@@ -138,20 +250,19 @@ def plot_daily_trend(df, output_file='analysis_daily_trend.png'):
     print(f"✅ 图表已保存: {output_file}")
 
 
-def plot_tag_comparison(df, output_file='analysis_tag_comparison.png'):
+def plot_tag_comparison(df, output_file='analysis_tag_comparison.png', latest_df=None):
     """绘制标签对比图"""
     if not HAS_PLOT or df.empty:
         return
     
     # 使用最新日期的数据
-    latest_date = df['date'].max()
-    latest_df = df[df['date'] == latest_date]
+    latest_date, latest_df = get_latest_data(df, latest_df)
     
     fig, axes = plt.subplots(2, 2, figsize=(15, 10))
     fig.suptitle(f'Tag Performance Comparison ({latest_date})', fontsize=16, fontweight='bold')
     
     # 按标签分组统计
-    tag_stats = latest_df.groupby('tag').agg({
+    tag_stats = latest_df.groupby('tag', observed=True).agg({
         'address': 'count',
         'pnl_7d': 'mean',
         'win_rate_7d': 'mean',
@@ -195,13 +306,12 @@ def plot_tag_comparison(df, output_file='analysis_tag_comparison.png'):
     print(f"✅ 图表已保存: {output_file}")
 
 
-def plot_tool_comparison(df, output_file='analysis_tool_comparison.png'):
+def plot_tool_comparison(df, output_file='analysis_tool_comparison.png', latest_df=None):
     """绘制工具对比图"""
     if not HAS_PLOT or df.empty:
         return
     
-    latest_date = df['date'].max()
-    latest_df = df[df['date'] == latest_date]
+    latest_date, latest_df = get_latest_data(df, latest_df)
     
     # 过滤掉"无"工具的数据
     tool_df = latest_df[latest_df['tool'] != '无']
@@ -214,7 +324,7 @@ def plot_tool_comparison(df, output_file='analysis_tool_comparison.png'):
     fig.suptitle(f'Tool Performance Comparison ({latest_date})', fontsize=16, fontweight='bold')
     
     # 按工具分组
-    tool_stats = tool_df.groupby('tool').agg({
+    tool_stats = tool_df.groupby('tool', observed=True).agg({
         'address': 'count',
         'pnl_7d': ['mean', 'median'],
         'win_rate_7d': 'mean',
@@ -261,13 +371,12 @@ def plot_tool_comparison(df, output_file='analysis_tool_comparison.png'):
     print(f"✅ 图表已保存: {output_file}")
 
 
-def plot_pnl_distribution(df, output_file='analysis_pnl_distribution.png'):
+def plot_pnl_distribution(df, output_file='analysis_pnl_distribution.png', latest_df=None):
     """绘制盈亏分布图"""
     if not HAS_PLOT or df.empty:
         return
     
-    latest_date = df['date'].max()
-    latest_df = df[df['date'] == latest_date]
+    latest_date, latest_df = get_latest_data(df, latest_df)
     
     fig, axes = plt.subplots(1, 2, figsize=(15, 5))
     fig.suptitle(f'PNL Distribution ({latest_date})', fontsize=16, fontweight='bold')
@@ -319,10 +428,20 @@ def main():
     
     # 生成图表
     if HAS_PLOT:
-        plot_daily_trend(df)
-        plot_tag_comparison(df)
-        plot_tool_comparison(df)
-        plot_pnl_distribution(df)
+        # 最新日期的数据只筛选一次，供各对比图复用
+        _, latest_df = get_latest_data(df)
+        
+        # 各图表相互独立且渲染是 CPU 密集型（matplotlib 非线程安全），用多进程并行绘制；
+        # 对比图只需要最新日期的数据，只把这部分传给子进程
+        with ProcessPoolExecutor(max_workers=PLOT_WORKERS) as executor:
+            futures = [
+                executor.submit(plot_daily_trend, df),
+                executor.submit(plot_tag_comparison, latest_df, latest_df=latest_df),
+                executor.submit(plot_tool_comparison, latest_df, latest_df=latest_df),
+                executor.submit(plot_pnl_distribution, latest_df, latest_df=latest_df),
+            ]
+            for future in futures:
+                future.result()
         
         print("\n" + "=" * 80)
         print("✅ 所有图表生成完成！")